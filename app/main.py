@@ -1,8 +1,10 @@
-import sqlite3
+import queue
 import tkinter as tk
 import subprocess
 import sys
+import threading
 
+from collections import deque
 from tkinter import ttk
 from tkinter import messagebox
 from pathlib import Path
@@ -12,42 +14,265 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 SCRIPTS_DIR = BASE_DIR / "scripts"
 
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from create_db import check_schema  # noqa: E402
+from progress import parse_progress  # noqa: E402
+from repository import (  # noqa: E402
+    ALLOWED_ORDER, DISPLAY_COLUMNS, PAGE_SIZE, PagedQuery, connect,
+    database_generation, display_rows, filter_clause,
+)
+from similarity import SimilarityIndex  # noqa: E402
+
 DB_PATH = DATA_DIR / "exoplanets.db"
 
+# How often to look for a database swapped in by a refresh
+GENERATION_POLL_MS = 2000
+# How often the GUI drains progress events from the refresh worker
+REFRESH_POLL_MS = 100
+
+# Pause in typing after which the filter bar applies its text
+FILTER_DELAY_MS = 150
+
+# Planets listed by "Find Similar"
+SIMILAR_COUNT = 20
+
+# Scripts run, in order, by "Update Database"
+REFRESH_SCRIPTS = ("update_data.py", "load_data.py")
 
-ALLOWED_ORDER = {
-    "name": "pl_name",
-    "distance": "sy_dist",
-    "size": "pl_rade",
-    "insolation": "pl_insol",
-    "mass": "pl_masse",
-    "orbital_period": "pl_orbper",
-    "discovery_year": "disc_year",
-    "publication_date": "disc_pubdate",
-    "star_mass": "st_mass"
+PHASE_LABELS = {
+    "copy": "Copying database...",
+    "merge": "Merging changes...",
+    "validate": "Validating new database...",
 }
 
+PREFETCH_ROWS = PAGE_SIZE
+ROW_HEIGHT = 20
+
+
+class SortCache:
+    """
+    The exoplanets table held in memory, with cached sort orders.
+
+    The rows are read once per database generation and kept as one
+    tuple per column. The sort order for each key in `ALLOWED_ORDER` is
+    computed the first time it is asked for and kept, so switching sorts
+    never touches the database. Rows are ordered like the SQL queries:
+    by value, then by name, with missing values last in either
+    direction.
+    """
+
+    def __init__(self, conn):
+        rows = display_rows(conn)
+        self.count = len(rows)
+        self.columns = list(zip(*rows)) or [() for _ in DISPLAY_COLUMNS]
+        self.orders = {}
+
+    def order(self, order_key):
+        """
+        Returns (with value, without value) row indices for a sort key.
+        """
+        if order_key not in self.orders:
+            column = self.columns[
+                DISPLAY_COLUMNS.index(ALLOWED_ORDER[order_key])]
+            names = self.columns[0]
+
+            by_name = sorted(range(self.count), key=names.__getitem__)
+            present = [i for i in by_name if column[i] is not None]
+            missing = [i for i in by_name if column[i] is None]
+            present.sort(key=column.__getitem__)
+            self.orders[order_key] = (present, missing)
+        return self.orders[order_key]
+
+    def view(self, order_key, descending=False):
+        return SortedView(self, order_key, descending)
+
+
+class SortedView:
+    """
+    One sort order of a `SortCache`, read like a `PagedQuery`.
+
+    Descending order walks the rows with a value backwards, so it needs
+    no sort of its own.
+    """
+
+    def __init__(self, cache, order_key, descending=False):
+        self.cache = cache
+        self.count = cache.count
+        self.present, self.missing = cache.order(order_key)
+        self.descending = descending
+
+    def rows(self, start, stop):
+        start = max(start, 0)
+        stop = min(stop, self.count)
+        n_present = len(self.present)
+
+        indices = []
+        for position in range(start, stop):
+            if position >= n_present:
+                indices.append(self.missing[position - n_present])
+            elif self.descending:
+                indices.append(self.present[n_present - 1 - position])
+            else:
+                indices.append(self.present[position])
+
+        columns = self.cache.columns
+        return [tuple(column[i] for column in columns) for i in indices]
+
+
+class RefreshWorker(threading.Thread):
+    """
+    Runs the refresh scripts in a background thread.
+
+    Progress events, log output and the final outcome are put on
+    `events` as ``(kind, payload)`` tuples; the Tk thread drains the
+    queue with ``after()``, since Tk must only be touched from there.
+    The final event is one of ``"done"``, ``"failed"`` or ``"cancelled"``.
+    """
+
+    def __init__(self, events):
+        super().__init__(daemon=True)
+        self.events = events
+        self.process = None
+        self.cancelled = threading.Event()
+
+    def run(self):
+        for script in REFRESH_SCRIPTS:
+            if self.cancelled.is_set():
+                break
+
+            self.process = subprocess.Popen(
+                [sys.executable, str(SCRIPTS_DIR / script), "--progress"],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, encoding="utf-8",
+            )
+            output = deque(maxlen=20)
+            for line in self.process.stdout:
+                event = parse_progress(line)
+                if event is None:
+                    output.append(line)
+                else:
+                    self.events.put(("progress", event))
+
+            if self.process.wait() != 0 and not self.cancelled.is_set():
+                self.events.put(("failed", "".join(output)))
+                return
+
+        if self.cancelled.is_set():
+            self.events.put(("cancelled", None))
+        else:
+            self.events.put(("done", None))
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+
+class EmptyView:
+    """
+    Stands in for a view while the database cannot be shown.
+    """
+
+    count = 0
+
+    def rows(self, start, stop):
+        return []
+
 
 class ExoplanetApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Exoplanet Explorer")
+        self.order_key = "name"
+        self.descending = False
+        self.cache = None
+        self.search = ("", [])
+        self.filter_job = None
+        self.top = 0
+        self.visible_rows = 25
+        self.worker = None
+        self.similarity = None
 
-        self.conn = sqlite3.connect(DB_PATH)
-        self.cursor = self.conn.cursor()
+        self.connect()
 
         self.create_widgets()
         self.load_data("name")
+        if self.outdated:
+            messagebox.showerror("Outdated database", self.outdated)
+        self.root.after(GENERATION_POLL_MS, self.watch_database)
+
+    def connect(self):
+        """
+        Opens the current database.
+
+        A database with migrations pending is not queried; `outdated`
+        then holds the reason, and is None otherwise.
+        """
+        self.generation = database_generation(DB_PATH)
+        self.conn = connect(DB_PATH, readonly=True)
+        try:
+            check_schema(self.conn)
+            self.outdated = None
+        except ValueError as error:
+            self.outdated = str(error)
+
+    def reconnect_if_changed(self):
+        """
+        Reopens the database if a refresh swapped in a new generation.
+
+        Returns True when a new connection was opened.
+        """
+        if database_generation(DB_PATH) == self.generation:
+            return False
+
+        self.conn.close()
+        self.connect()
+        return True
+
+    def watch_database(self):
+        outdated = self.outdated
+        if self.reconnect_if_changed():
+            self.cache = None
+            self.load_data(self.order_key, self.descending)
+            if outdated and not self.outdated:
+                self.status.set("")
+        self.root.after(GENERATION_POLL_MS, self.watch_database)
 
     def create_widgets(self):
+        filter_frame = tk.Frame(self.root)
+        filter_frame.pack(fill="x", padx=5, pady=5)
+
+        tk.Label(filter_frame, text="Filter:").pack(side="left")
+        self.filter_text = tk.StringVar()
+        self.filter_text.trace_add("write", self.on_filter_change)
+        tk.Entry(filter_frame, textvariable=self.filter_text,
+                 width=60).pack(side="left", padx=5)
+        self.filter_status = tk.StringVar(
+            value="e.g. Kepler-* size:0.8..1.5 insolation:..2")
+        tk.Label(filter_frame, textvariable=self.filter_status,
+                 anchor="w").pack(side="left", fill="x", expand=True)
+
+        table_frame = tk.Frame(self.root)
+        table_frame.pack(fill="both", expand=True)
+
+        # The tree only ever holds the visible rows; the scrollbar is
+        # driven by hand over the full row count.
+        self.scrollbar = ttk.Scrollbar(table_frame, orient="vertical",
+                                       command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
         self.tree = ttk.Treeview(
-            self.root,
+            table_frame,
             columns=("name", "dist", "size", "insol",
                      "mass", "star_mass", "orbital_period",
                      "discovery_year", "publication_date",
+                     "density", "gravity", "habitable_zone",
                      ),
-            show="headings"
+            show="headings",
+            height=self.visible_rows,
         )
+        ttk.Style().configure("Treeview", rowheight=ROW_HEIGHT)
 
         self.tree.heading("name", text="Name")
         self.tree.heading("dist", text="Distance (pc)")
@@ -58,88 +283,299 @@ class ExoplanetApp:
         self.tree.heading("orbital_period", text="Orbital Period")
         self.tree.heading("discovery_year", text="Discovery Year")
         self.tree.heading("publication_date", text="Publication Date")
+        self.tree.heading("density", text="Density (g/cm³)")
+        self.tree.heading("gravity", text="Gravity (m/s²)")
+        self.tree.heading("habitable_zone", text="Habitable Zone")
 
-        self.tree.pack(fill="both", expand=True)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_by(3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_by(
+            -self.visible_rows))
+        self.tree.bind("<Next>", lambda event: self.scroll_by(
+            self.visible_rows))
 
         btn_frame = tk.Frame(self.root)
         btn_frame.pack(pady=5)
 
         tk.Button(btn_frame, text="By Name",
-                  command=lambda: self.load_data("name")
+                  command=lambda: self.sort_by("name")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Distance",
-                  command=lambda: self.load_data("distance")
+                  command=lambda: self.sort_by("distance")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Size",
-                  command=lambda: self.load_data("size")
+                  command=lambda: self.sort_by("size")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Mass",
-                  command=lambda: self.load_data("mass")
+                  command=lambda: self.sort_by("mass")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Insolation",
-                  command=lambda: self.load_data("insolation")
+                  command=lambda: self.sort_by("insolation")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Orbital Period",
-                  command=lambda: self.load_data("orbital_period")
+                  command=lambda: self.sort_by("orbital_period")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Discovery Year",
-                  command=lambda: self.load_data("discovery_year")
+                  command=lambda: self.sort_by("discovery_year")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Publication Date",
-                  command=lambda: self.load_data("publication_date")
+                  command=lambda: self.sort_by("publication_date")
                   ).pack(side="left")
         tk.Button(btn_frame, text="By Star Mass",
-                  command=lambda: self.load_data("star_mass")
+                  command=lambda: self.sort_by("star_mass")
+                  ).pack(side="left")
+        tk.Button(btn_frame, text="By Density",
+                  command=lambda: self.sort_by("density")
+                  ).pack(side="left")
+        tk.Button(btn_frame, text="By Gravity",
+                  command=lambda: self.sort_by("gravity")
                   ).pack(side="left")
+        tk.Button(btn_frame, text="By Habitable Zone",
+                  command=lambda: self.sort_by("habitable_zone")
+                  ).pack(side="left")
+        tk.Button(btn_frame, text="Find Similar",
+                  command=self.find_similar
+                  ).pack(side="left", padx=(10, 0))
+
+        # Update database button, with progress of a running update
+        update_frame = tk.Frame(self.root)
+        update_frame.pack(pady=5)
 
-        # Update database button
-        tk.Button(self.root, text="Update Database",
-                  command=self.update_database,
-                  ).pack(pady=5)
+        self.update_button = tk.Button(update_frame, text="Update Database",
+                                       command=self.update_database)
+        self.update_button.pack(side="left")
+        self.cancel_button = tk.Button(update_frame, text="Cancel",
+                                       command=self.cancel_update,
+                                       state="disabled")
+        self.cancel_button.pack(side="left")
+        self.progress = ttk.Progressbar(update_frame, length=250)
+        self.progress.pack(side="left", padx=5)
+        self.status = tk.StringVar()
+        tk.Label(update_frame, textvariable=self.status,
+                 width=40, anchor="w").pack(side="left")
 
-    def load_data(self, order_key):
-        order_by = ALLOWED_ORDER[order_key]
+    def sort_by(self, order_key):
+        """
+        Sorts by a key; choosing the current key again flips the direction.
+        """
+        descending = order_key == self.order_key and not self.descending
+        self.load_data(order_key, descending)
 
-        self.cursor.execute(f"""
-                            SELECT pl_name, sy_dist, pl_rade, 
-                            pl_insol, pl_masse, st_mass, pl_orbper, 
-                            disc_year, disc_pubdate
-                            FROM exoplanets
-                            ORDER BY {order_by} IS NULL, {order_by}
-                            """)
+    def load_data(self, order_key, descending=False):
+        self.order_key = order_key
+        self.descending = descending
+        if self.reconnect_if_changed() or self.cache is None:
+            self.cache = None if self.outdated else SortCache(self.conn)
 
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+        where, params = self.search
+        if self.outdated:
+            self.status.set(self.outdated)
+            self.view = EmptyView()
+        elif where:
+            self.view = PagedQuery(self.conn, order_key,
+                                   descending=descending,
+                                   where=where, params=params)
+        else:
+            self.view = self.cache.view(order_key, descending)
+        self.top = 0
+        self.render()
 
-        for row in self.cursor.fetchall():
+    def on_filter_change(self, *args):
+        if self.filter_job:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """
+        Shows the planets matching the text of the filter bar.
+
+        Text that does not parse leaves the current results in place.
+        """
+        self.filter_job = None
+        try:
+            self.search = filter_clause(self.filter_text.get())
+        except ValueError as error:
+            self.filter_status.set(str(error))
+            return
+
+        self.load_data(self.order_key, self.descending)
+        if self.search[0]:
+            self.filter_status.set(f"{self.view.count:,} planets match")
+        else:
+            self.filter_status.set("")
+
+    def render(self):
+        """
+        Shows the rows of the current window and prefetches the next one.
+        """
+        count = self.view.count
+        self.top = max(0, min(self.top, count - self.visible_rows))
+        stop = self.top + self.visible_rows
+        rows = self.view.rows(self.top, stop)
+
+        items = self.tree.get_children()
+        for item in items[len(rows):]:
+            self.tree.delete(item)
+        for i, row in enumerate(rows):
             formatted = [
                 value if value is not None else "No value" for value in row
             ]
-            self.tree.insert("", tk.END, values=formatted)
+            if i < len(items):
+                self.tree.item(items[i], values=formatted)
+            else:
+                self.tree.insert("", tk.END, values=formatted)
+
+        if count:
+            self.scrollbar.set(self.top / count, min(stop / count, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+        self.view.rows(stop, stop + PREFETCH_ROWS)
+
+    def scroll_by(self, rows):
+        self.top += rows
+        self.render()
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * self.view.count)
+            self.render()
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.visible_rows)
+        else:
+            self.scroll_by(int(amount))
+
+    def on_mousewheel(self, event):
+        self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        header = ROW_HEIGHT + 4
+        visible_rows = max(1, (event.height - header) // ROW_HEIGHT)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.render()
 
     def update_database(self):
-        try:
-            subprocess.run(
-                [sys.executable, str(SCRIPTS_DIR / "update_data.py")],
-                check=True
-            )
-            subprocess.run(
-                [sys.executable, str(SCRIPTS_DIR / "load_data.py")],
-                check=True
-            )
+        if self.worker and self.worker.is_alive():
+            return
+
+        self.events = queue.Queue()
+        self.worker = RefreshWorker(self.events)
+        self.worker.start()
+
+        self.update_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.status.set("Starting update...")
+        self.set_progress(None)
+        self.root.after(REFRESH_POLL_MS, self.poll_refresh)
+
+    def cancel_update(self):
+        if self.worker:
+            self.status.set("Cancelling...")
+            self.worker.cancel()
+
+    def poll_refresh(self):
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self.show_progress(payload)
+            else:
+                self.finish_update(kind, payload)
+                return
+        self.root.after(REFRESH_POLL_MS, self.poll_refresh)
+
+    def show_progress(self, event):
+        phase = event["phase"]
+        if phase == "download":
+            done, total = event["bytes"], event.get("total")
+            self.set_progress(done / total if total else None)
+            text = f"Downloading: {done / 1e6:,.1f} MB"
+            if total:
+                text += f" of {total / 1e6:,.1f} MB"
+            self.status.set(text)
+        elif phase == "load":
+            self.set_progress(None)
+            self.status.set(f"Loading: {event['rows']:,} rows")
+        else:
+            self.set_progress(None)
+            self.status.set(PHASE_LABELS.get(phase, phase))
 
+    def set_progress(self, fraction):
+        """
+        Shows a fraction done, or a busy indicator when it is None.
+        """
+        if fraction is None:
+            if str(self.progress["mode"]) != "indeterminate":
+                self.progress.config(mode="indeterminate")
+                self.progress.start()
+        else:
+            if str(self.progress["mode"]) != "determinate":
+                self.progress.stop()
+                self.progress.config(mode="determinate", maximum=1.0)
+            self.progress["value"] = fraction
+
+    def finish_update(self, outcome, output):
+        self.progress.stop()
+        self.progress.config(mode="determinate", maximum=1.0, value=0)
+        self.update_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.worker = None
+
+        if outcome == "done":
+            self.status.set("")
+            self.load_data(self.order_key, self.descending)
             messagebox.showinfo(
                 "Update complete", "Exoplanet database updated successfully."
             )
-
-            self.load_data("name")
-
-        except subprocess.CalledProcessError:
+        elif outcome == "cancelled":
+            self.status.set("Update cancelled.")
+        else:
+            self.status.set("")
             messagebox.showerror(
-                "Update failed", "Error updating the database."
+                "Update failed", f"Error updating the database.\n\n{output}"
             )
 
+    def find_similar(self):
+        """
+        Lists the planets most like the selected one in a new window.
+
+        Planets are compared on mass, radius, orbital period and
+        insolation; see `SimilarityIndex`.
+        """
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showinfo("Find Similar", "Select a planet first.")
+            return
+        name = self.tree.item(selection[0], "values")[0]
+
+        if self.similarity is None or \
+                self.similarity.generation != self.generation:
+            self.similarity = SimilarityIndex.open(DB_PATH)
+        try:
+            results = self.similarity.nearest(name, SIMILAR_COUNT)
+        except ValueError as error:
+            messagebox.showinfo("Find Similar", str(error))
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Planets similar to {name}")
+        tree = ttk.Treeview(window, columns=("name", "distance"),
+                            show="headings", height=len(results))
+        tree.heading("name", text="Name")
+        tree.heading("distance", text="Distance")
+        for similar, distance in results:
+            tree.insert("", tk.END, values=(similar, f"{distance:.3f}"))
+        tree.pack(fill="both", expand=True)
+
     def close(self):
+        if self.worker:
+            self.worker.cancel()
         self.conn.close()
         self.root.destroy()
 
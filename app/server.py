@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import json
+import sys
+import threading
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
+SCRIPTS_DIR = BASE_DIR / "scripts"
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from create_db import check_schema  # noqa: E402
+from repository import (  # noqa: E402
+    ALLOWED_ORDER, DISPLAY_COLUMNS, PAGE_SIZE, POOL_SIZE, ConnectionPool,
+    PagedQuery, database_generation, filter_clause,
+)
+
+DB_PATH = DATA_DIR / "exoplanets.db"
+
+HOST = "127.0.0.1"
+PORT = 8000
+
+# Responses kept for hot queries, per database generation
+CACHE_SIZE = 256
+MAX_LIMIT = 1000
+
+
+class QueryService:
+    """
+    Serves the exoplanets table as JSON over HTTP.
+
+    ``GET /planets`` returns one page of planets and takes the query
+    parameters ``sort`` (a key of `ALLOWED_ORDER`), ``order`` (``asc`` or
+    ``desc``), ``offset``, ``limit`` and ``filter`` (the syntax of the
+    GUI's filter bar). ``GET /sort-keys`` lists the sort keys.
+
+    Queries run on a pool of read-only connections in worker threads,
+    so the event loop keeps accepting requests meanwhile. Each database
+    generation gets its own pool; the previous one is closed once the
+    queries running on it finish. Responses carry an ETag naming the
+    database generation: a client revalidating with ``If-None-Match``
+    gets 304 until a refresh swaps in a new database. The bodies of
+    recent responses are kept in an LRU cache, which is dropped with the
+    generation it belongs to.
+    """
+
+    def __init__(self, db_path=DB_PATH, cache_size=CACHE_SIZE,
+                 workers=POOL_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.generation = None
+        self.pool = None
+        # Queries in flight, by the pool they run on
+        self.running = Counter()
+
+    async def start(self, host=HOST, port=PORT):
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        self.executor.shutdown()
+        for pool in {self.pool, *self.running} - {None}:
+            pool.close()
+
+    def open_pool(self, generation):
+        """
+        Switches to a pool of connections to a new database generation.
+
+        The connections are all opened up front, and opened again if the
+        file was replaced meanwhile, so none of them can read a newer
+        database than the generation its responses are tagged with.
+        Returns the generation the pool reads.
+
+        Raises ValueError, and keeps the current pool, if the new
+        database has migrations pending.
+        """
+        while True:
+            pool = ConnectionPool(self.db_path, self.workers)
+            pool.open()
+            try:
+                current = database_generation(self.db_path)
+            except FileNotFoundError:
+                pool.close()
+                raise
+            if current == generation:
+                break
+            pool.close()
+            generation = current
+
+        try:
+            with pool.connection() as conn:
+                check_schema(conn)
+        except ValueError:
+            pool.close()
+            raise
+
+        previous, self.pool = self.pool, pool
+        self.generation = generation
+        self.cache.clear()
+        if previous is not None and not self.running[previous]:
+            previous.close()
+        return generation
+
+    async def run_query(self, *params):
+        pool = self.pool
+        self.running[pool] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, query_planets, pool, *params)
+        finally:
+            self.running[pool] -= 1
+            if not self.running[pool]:
+                del self.running[pool]
+                if pool is not self.pool:
+                    pool.close()
+
+    async def handle(self, reader, writer):
+        """
+        Answers the requests of one client connection, with keep-alive.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = \
+                        request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.send(writer, HTTPStatus.BAD_REQUEST, {},
+                                    error_body("Malformed request line"))
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                status, response_headers, body = \
+                    await self.respond(method, target, headers)
+                if method == "HEAD":
+                    response_headers["Content-Length"] = str(len(body))
+                    body = b""
+
+                keep_alive = version == "HTTP/1.1" and \
+                    headers.get("connection", "").lower() != "close"
+                if not keep_alive:
+                    response_headers["Connection"] = "close"
+                await self.send(writer, status, response_headers, body)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, headers, body):
+        headers.setdefault("Content-Length", str(len(body)))
+        if body:
+            headers.setdefault("Content-Type", "application/json")
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def respond(self, method, target, headers):
+        """
+        Returns the status, headers and body answering one request.
+        """
+        if method not in ("GET", "HEAD"):
+            return (HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "GET, HEAD"},
+                    error_body(f"Method {method} not allowed"))
+
+        url = urlsplit(target)
+        if url.path not in ("/planets", "/sort-keys"):
+            return HTTPStatus.NOT_FOUND, {}, error_body("No such resource")
+
+        try:
+            generation = database_generation(self.db_path)
+            if generation != self.generation:
+                generation = self.open_pool(generation)
+        except FileNotFoundError:
+            return (HTTPStatus.SERVICE_UNAVAILABLE, {},
+                    error_body("No database yet"))
+        except ValueError as error:
+            return (HTTPStatus.SERVICE_UNAVAILABLE, {},
+                    error_body(str(error)))
+
+        try:
+            params = page_params(dict(parse_qsl(url.query))) \
+                if url.path == "/planets" else None
+        except ValueError as error:
+            return HTTPStatus.BAD_REQUEST, {}, error_body(str(error))
+
+        etag = '"{:x}-{:x}"'.format(*generation)
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in headers.get("if-none-match", "") or \
+                headers.get("if-none-match") == "*":
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+
+        key = (url.path, params)
+        body = self.cache.get(key)
+        if body is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        else:
+            if params is None:
+                result = {"sort_keys": list(ALLOWED_ORDER)}
+            else:
+                result = await self.run_query(*params)
+            body = json.dumps(result).encode("utf-8")
+            if generation == self.generation and self.cache_size:
+                self.cache[key] = body
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        return HTTPStatus.OK, response_headers, body
+
+
+def page_params(query):
+    """
+    Validates the parameters of ``/planets``.
+
+    Returns (sort, descending, offset, limit, filter text); raises
+    ValueError for a parameter out of range.
+    """
+    sort = query.get("sort", "name")
+    if sort not in ALLOWED_ORDER:
+        raise ValueError(f"Unknown sort key: {sort}")
+
+    order = query.get("order", "asc")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be asc or desc")
+
+    try:
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise ValueError("offset and limit must be integers") from None
+    if offset < 0 or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"offset must be >= 0 and limit 1 to {MAX_LIMIT}")
+
+    text = " ".join(query.get("filter", "").split())
+    filter_clause(text)
+    return sort, order == "desc", offset, limit, text
+
+
+def query_planets(pool, sort, descending, offset, limit, text):
+    where, params = filter_clause(text)
+    with pool.connection() as conn:
+        view = PagedQuery(conn, sort, page_size=limit, descending=descending,
+                          where=where, params=params)
+        rows = view.fetch_offset(offset) if offset < view.count else []
+
+    return {
+        "count": view.count,
+        "offset": offset,
+        "limit": limit,
+        "sort": sort,
+        "order": "desc" if descending else "asc",
+        "planets": [dict(zip(DISPLAY_COLUMNS, row)) for row in rows],
+    }
+
+
+def error_body(message):
+    return json.dumps({"error": message}).encode("utf-8")
+
+
+def serve_in_thread(service, host=HOST, port=0):
+    """
+    Runs `service` on an event loop in a daemon thread.
+
+    For tests and benchmarks that drive the service from this process.
+    Returns the port listened on and a function that stops the service.
+    """
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(service.start(host, port))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def shutdown():
+        server.close()
+        await server.wait_closed()
+        # Give the handlers of closed client connections time to finish
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        if tasks:
+            await asyncio.wait(tasks, timeout=1)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        service.close()
+
+    return server.sockets[0].getsockname()[1], stop
+
+
+async def serve(host=HOST, port=PORT, db_path=DB_PATH, cache_size=CACHE_SIZE):
+    service = QueryService(db_path, cache_size)
+    server = await service.start(host, port)
+    print(f"Serving {db_path.name} on http://{host}:{port}/planets")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the exoplanet database as JSON over HTTP.")
+    parser.add_argument("--host", default=HOST,
+                        help=f"interface to listen on (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT,
+                        help=f"port to listen on (default: {PORT})")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help=f"responses kept in memory "
+                             f"(default: {CACHE_SIZE}, 0 disables)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, cache_size=args.cache_size))
+    except KeyboardInterrupt:
+        pass
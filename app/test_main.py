@@ -0,0 +1,88 @@
+import os
+import queue
+import sqlite3
+
+import pytest
+
+from create_db import migrate
+from main import ALLOWED_ORDER
+from main import ExoplanetApp
+from main import RefreshWorker
+from main import SortCache
+
+
+def drain(events):
+    received = []
+    while True:
+        kind, payload = events.get(timeout=10)
+        received.append((kind, payload))
+        if kind != "progress":
+            return received
+
+
+def test_refresh_worker_reports_progress_and_outcome(tmp_path, monkeypatch):
+    (tmp_path / "fetch.py").write_text(
+        'print("PROGRESS {\\"phase\\": \\"download\\", \\"bytes\\": 5}")\n'
+        'print("log line")\n'
+    )
+    (tmp_path / "fail.py").write_text(
+        'import sys\nprint("boom")\nsys.exit(1)\n'
+    )
+    monkeypatch.setattr("main.SCRIPTS_DIR", tmp_path)
+
+    monkeypatch.setattr("main.REFRESH_SCRIPTS", ("fetch.py",))
+    events = queue.Queue()
+    RefreshWorker(events).start()
+    assert drain(events) == [
+        ("progress", {"phase": "download", "bytes": 5}),
+        ("done", None),
+    ]
+
+    monkeypatch.setattr("main.REFRESH_SCRIPTS", ("fetch.py", "fail.py"))
+    events = queue.Queue()
+    RefreshWorker(events).start()
+    assert drain(events)[-1] == ("failed", "boom\n")
+
+
+@pytest.mark.parametrize("order_key", sorted(ALLOWED_ORDER))
+def test_sort_cache_matches_database_order(conn, order_key, expected_rows):
+    cache = SortCache(conn)
+    expected = expected_rows(conn, ALLOWED_ORDER[order_key])
+
+    assert cache.view(order_key).rows(0, cache.count) == expected
+
+
+def test_sorted_view_descending_keeps_missing_values_last(conn):
+    cache = SortCache(conn)
+    ascending = cache.view("size").rows(0, cache.count)
+    n_present = sum(row[2] is not None for row in ascending)
+
+    descending = cache.view("size", descending=True).rows(0, cache.count)
+
+    assert descending[:n_present] == ascending[:n_present][::-1]
+    assert descending[n_present:] == ascending[n_present:]
+    assert cache.view("size", descending=True).rows(5, 8) == descending[5:8]
+
+
+def test_app_does_not_query_a_database_with_pending_migrations(tmp_path,
+                                                             monkeypatch):
+    db_path = tmp_path / "exoplanets.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE exoplanets (pl_name TEXT)")
+    conn.close()
+    monkeypatch.setattr("main.DB_PATH", db_path)
+
+    # Without Tk: only the database handling is exercised
+    app = ExoplanetApp.__new__(ExoplanetApp)
+    app.connect()
+    assert "schema version 0" in app.outdated
+
+    new_path = tmp_path / "exoplanets.db.new"
+    conn = sqlite3.connect(new_path)
+    migrate(conn)
+    conn.close()
+    os.replace(new_path, db_path)
+
+    assert app.reconnect_if_changed()
+    assert app.outdated is None
+    app.conn.close()
@@ -0,0 +1,143 @@
+import http.client
+import json
+import os
+
+import pytest
+
+from create_db import migrate
+from repository import ConnectionPool
+from repository import connect
+from server import QueryService
+from server import serve_in_thread
+
+
+def make_database(db_path, names):
+    conn = connect(db_path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO exoplanets (pl_name, pl_rade, discoverymethod) "
+        "VALUES (?, ?, ?)",
+        [(name, float(i) if i % 3 else None, "Transit")
+         for i, name in enumerate(names)],
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def service(tmp_path):
+    db_path = tmp_path / "exoplanets.db"
+    make_database(db_path, [f"Planet {i:03d}" for i in range(250)])
+
+    service = QueryService(db_path, cache_size=8)
+    service.port, stop = serve_in_thread(service, "127.0.0.1")
+    yield service
+    stop()
+
+
+def get(client, target, **headers):
+    client.request("GET", target, headers=headers)
+    response = client.getresponse()
+    body = response.read()
+    return response, json.loads(body) if body else None
+
+
+def test_planets_are_paged_sorted_and_filtered(service):
+    client = http.client.HTTPConnection("127.0.0.1", service.port)
+
+    response, page = get(client, "/planets?sort=size&order=desc&limit=5")
+    assert response.status == 200
+    assert page["count"] == 250
+    assert [p["pl_rade"] for p in page["planets"]] == \
+        [248.0, 247.0, 245.0, 244.0, 242.0]
+
+    # Rows without a radius come last, by name
+    _, page = get(client, "/planets?sort=size&offset=164&limit=4")
+    assert [p["pl_name"] for p in page["planets"]] == \
+        ["Planet 247", "Planet 248", "Planet 000", "Planet 003"]
+
+    _, page = get(client, "/planets?filter=%22Planet%2012*%22%20size:..125")
+    assert [p["pl_name"] for p in page["planets"]] == \
+        ["Planet 121", "Planet 122", "Planet 124", "Planet 125"]
+    client.close()
+
+
+@pytest.mark.parametrize("target", [
+    "/planets?sort=color", "/planets?limit=0", "/planets?filter=mass:x",
+])
+def test_bad_parameters_are_rejected(service, target):
+    client = http.client.HTTPConnection("127.0.0.1", service.port)
+    response, body = get(client, target)
+    assert response.status == 400
+    assert "error" in body
+
+    # Even for a client revalidating a cached response
+    response, body = get(client, target, **{"If-None-Match": "*"})
+    assert response.status == 400
+    client.close()
+
+
+def test_etag_follows_the_database_generation(service, tmp_path):
+    client = http.client.HTTPConnection("127.0.0.1", service.port)
+    response, first = get(client, "/planets?limit=1")
+    etag = response.getheader("ETag")
+
+    response, _ = get(client, "/planets?limit=1", **{"If-None-Match": etag})
+    assert response.status == 304
+    get(client, "/planets?limit=1")
+    assert service.hits == 1
+
+    # A refresh renames a new file over the database
+    old_pool = service.pool
+    new_path = tmp_path / "exoplanets.db.new"
+    make_database(new_path, ["Another b"])
+    os.replace(new_path, service.db_path)
+
+    response, page = get(client, "/planets?limit=1",
+                         **{"If-None-Match": etag})
+    assert response.status == 200
+    assert response.getheader("ETag") != etag
+    assert page["planets"][0]["pl_name"] == "Another b"
+    # The connections to the replaced file are closed
+    assert service.pool is not old_pool and not old_pool.opened
+    client.close()
+
+
+def test_pool_opened_during_a_refresh_reads_the_tagged_file(
+        service, tmp_path, monkeypatch):
+    # The refresh lands after the server computed the generation but
+    # before the pool connected
+    new_path = tmp_path / "exoplanets.db.new"
+    make_database(new_path, ["Another b"])
+    open_pool = ConnectionPool.open
+
+    def open_then_refresh(pool):
+        open_pool(pool)
+        if new_path.exists():
+            os.replace(new_path, service.db_path)
+
+    monkeypatch.setattr(ConnectionPool, "open", open_then_refresh)
+    client = http.client.HTTPConnection("127.0.0.1", service.port)
+    response, page = get(client, "/planets?limit=1")
+    etag = response.getheader("ETag")
+    client.close()
+
+    assert page["planets"][0]["pl_name"] == "Another b"
+    assert etag == '"{:x}-{:x}"'.format(*service.generation)
+    stat = service.db_path.stat()
+    assert service.generation == (stat.st_ino, stat.st_mtime_ns)
+
+
+def test_database_with_pending_migrations_is_not_served(service, tmp_path):
+    new_path = tmp_path / "exoplanets.db.new"
+    conn = connect(new_path)
+    conn.execute("CREATE TABLE exoplanets (pl_name TEXT)")
+    conn.close()
+    os.replace(new_path, service.db_path)
+
+    client = http.client.HTTPConnection("127.0.0.1", service.port)
+    response, body = get(client, "/planets")
+    client.close()
+
+    assert response.status == 503
+    assert "schema version 0" in body["error"]
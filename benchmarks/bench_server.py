@@ -0,0 +1,154 @@
+"""
+Measures the throughput of the query service at several client counts.
+
+The service runs in this process, on a private copy of the database, and
+each client is a thread with its own keep-alive connection that issues
+requests from a fixed mix of sorts, directions, offsets and filters for a
+set duration.
+
+    python benchmarks/bench_server.py --clients 1 4 16 --duration 5
+"""
+import argparse
+import http.client
+import itertools
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "app"))
+
+from server import (  # noqa: E402
+    ALLOWED_ORDER, DB_PATH, QueryService, serve_in_thread,
+)
+
+CLIENTS = (1, 2, 4, 8, 16, 32)
+DURATION = 3.0
+FILTERS = ("", "Kepler-*", "transit size:0.8..1.5", "insolation:..2")
+
+
+def request_mix(seed=0, size=500):
+    """
+    Returns the targets the clients cycle through.
+
+    Most requests ask for the first pages of common sorts, as a
+    browsing client would, so part of the mix is served from the
+    response cache.
+    """
+    rng = random.Random(seed)
+    keys = list(ALLOWED_ORDER)
+    targets = []
+    for _ in range(size):
+        params = {
+            "sort": rng.choice(keys),
+            "order": rng.choice(("asc", "desc")),
+            "offset": rng.choice((0, 0, 0, 100, 1000, rng.randrange(5000))),
+            "limit": 100,
+        }
+        text = rng.choice(FILTERS)
+        if text:
+            params["filter"] = text
+        targets.append(f"/planets?{urlencode(params)}")
+    return targets
+
+
+def run_client(port, targets, deadline, latencies, revalidate):
+    client = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    for target in itertools.cycle(targets):
+        if time.perf_counter() >= deadline:
+            break
+        headers = {}
+        if revalidate and target in etags:
+            headers["If-None-Match"] = etags[target]
+        start = time.perf_counter()
+        client.request("GET", target, headers=headers)
+        response = client.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status not in (200, 304):
+            raise RuntimeError(f"{target} answered {response.status}")
+        etags[target] = response.getheader("ETag")
+    client.close()
+
+
+def measure(port, clients, duration, targets, revalidate):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=run_client, args=(
+            port, targets[i::clients] or targets, deadline, latencies,
+            revalidate))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the query service at several client counts.")
+    parser.add_argument("--db", type=Path, default=DB_PATH,
+                        help="database to serve (a copy is used)")
+    parser.add_argument("--clients", type=int, nargs="+", default=CLIENTS,
+                        help="client counts to measure")
+    parser.add_argument("--duration", type=float, default=DURATION,
+                        help="seconds per client count")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="response cache size (0 disables the cache)")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="send If-None-Match for targets seen before")
+    parser.add_argument("--output", type=Path,
+                        help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "exoplanets.db"
+        shutil.copyfile(args.db, db_path)
+
+        service = QueryService(db_path, cache_size=args.cache_size)
+        port, stop = serve_in_thread(service, "127.0.0.1")
+
+        targets = request_mix()
+        results = []
+        print(f"{'clients':>8} {'requests':>9} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8}")
+        for clients in args.clients:
+            result = measure(port, clients, args.duration, targets,
+                             args.revalidate)
+            results.append(result)
+            print(f"{result['clients']:>8} {result['requests']:>9} "
+                  f"{result['requests_per_s']:>9.0f} "
+                  f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}")
+
+        stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cache_size": args.cache_size,
+                       "revalidate": args.revalidate,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
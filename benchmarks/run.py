@@ -0,0 +1,237 @@
+"""
+Times every stage of the pipeline on synthetic catalogues.
+
+For each catalogue size the runner measures, in order:
+
+- ``download``: `update_csv` fetching the catalogue from a local HTTP stub
+- ``load_data``: loading the CSV into an empty database
+- ``load_data_unchanged``: merging the same CSV again (nothing to write)
+- ``stream_csv_data``: the v1 pass deriving the CSV/JSON datasets
+- ``report:<name>``: each v1 report of `REPORTS`
+- ``sort:<key>``: each GUI sort through the data layer, reading the first
+  ten pages in ascending and then descending order
+
+Each stage runs `--repeat` times; the minimum and median wall times are
+written to a JSON file together with the commit, so runs on two commits
+can be compared with ``--compare``:
+
+    python benchmarks/run.py --sizes 10000 100000 --output before.json
+    python benchmarks/run.py --sizes 10000 100000 --output after.json
+    python benchmarks/run.py --compare before.json after.json
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+sys.path.insert(0, str(BASE_DIR / "v1"))
+
+import exoplanets  # noqa: E402
+from load_data import load_data  # noqa: E402
+from repository import ALLOWED_ORDER, PagedQuery, connect  # noqa: E402
+from synthetic import write_catalogue  # noqa: E402
+from update_data import update_csv  # noqa: E402
+
+SIZES = (10_000, 100_000, 1_000_000)
+REPEAT = 3
+SORT_PAGES = 10
+
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def timed(function, repeat=REPEAT, setup=None):
+    """
+    Runs `function` `repeat` times and summarizes its wall time.
+
+    `setup`, if given, runs untimed before each call. Output printed by
+    the stage is discarded.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return {"min_s": min(times), "median_s": statistics.median(times),
+            "runs": repeat}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def file_server(directory):
+    """
+    Serves `directory` over HTTP on a free local port.
+    """
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def read_pages(db_path, order_key, pages=SORT_PAGES):
+    conn = connect(db_path, readonly=True)
+    try:
+        for descending in (False, True):
+            view = PagedQuery(conn, order_key, descending=descending)
+            for number in range(pages):
+                view.page(number)
+    finally:
+        conn.close()
+
+
+def bench_size(rows, workdir, repeat=REPEAT):
+    """
+    Returns the stage timings for a catalogue of `rows` rows.
+    """
+    source = workdir / f"catalogue_{rows}.csv"
+    if not source.exists():
+        print(f"Generating {rows:,} rows...")
+        write_catalogue(source, rows)
+
+    run_dir = workdir / f"run_{rows}"
+    run_dir.mkdir(exist_ok=True)
+    csv_path = run_dir / "nasa_exoplanets.csv"
+    db_path = run_dir / "exoplanets.db"
+    stages = {}
+
+    with file_server(workdir) as base:
+        stages["download"] = timed(
+            lambda: update_csv(f"{base}/{source.name}", csv_path), repeat)
+
+    stages["load_data"] = timed(
+        lambda: load_data(csv_path, db_path), repeat,
+        setup=lambda: db_path.unlink(missing_ok=True))
+    stages["load_data_unchanged"] = timed(
+        lambda: load_data(csv_path, db_path), repeat)
+
+    exoplanets.DATA_DIR = run_dir
+    tables = []
+    stages["stream_csv_data"] = timed(
+        lambda: tables.append(exoplanets.stream_csv_data()), repeat)
+    table = tables[-1]
+    for name, report in exoplanets.REPORTS.items():
+        stages[f"report:{name}"] = timed(
+            lambda: exoplanets.write_report(table, *report), repeat)
+
+    for order_key in ALLOWED_ORDER:
+        stages[f"sort:{order_key}"] = timed(
+            lambda: read_pages(db_path, order_key), repeat)
+
+    for stage, result in stages.items():
+        result["rows"] = rows
+        print(f"{rows:>9,} {stage:<28} {result['median_s'] * 1000:>10.1f} ms")
+    return stages
+
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=BASE_DIR, capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def compare(before_path, after_path):
+    """
+    Prints the median time of every stage in two result files.
+    """
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{before['environment']['commit']} -> "
+          f"{after['environment']['commit']}")
+    for size, stages in after["sizes"].items():
+        for stage, result in stages.items():
+            old = before["sizes"].get(size, {}).get(stage)
+            new_ms = result["median_s"] * 1000
+            if old is None:
+                print(f"{int(size):>9,} {stage:<28} {'':>10} "
+                      f"{new_ms:>10.1f} ms")
+                continue
+            old_ms = old["median_s"] * 1000
+            ratio = new_ms / old_ms if old_ms else float("inf")
+            print(f"{int(size):>9,} {stage:<28} {old_ms:>10.1f} "
+                  f"{new_ms:>10.1f} ms  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the pipeline stages on synthetic catalogues.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="catalogue sizes in rows")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help=f"runs per stage (default: {REPEAT})")
+    parser.add_argument("--workdir", type=Path,
+                        help="keep catalogues and outputs here, reusing "
+                             "catalogues generated by earlier runs")
+    parser.add_argument("--output", type=Path,
+                        help="results file (default: "
+                             "benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", type=Path, nargs=2,
+                        metavar=("BEFORE", "AFTER"),
+                        help="compare two results files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = {"environment": environment(), "sizes": {}}
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or Path(
+            stack.enter_context(tempfile.TemporaryDirectory()))
+        workdir.mkdir(parents=True, exist_ok=True)
+        for rows in args.sizes:
+            results["sizes"][str(rows)] = bench_size(rows, workdir,
+                                                     args.repeat)
+
+    output = args.output or \
+        RESULTS_DIR / f"{results['environment']['commit'] or 'results'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
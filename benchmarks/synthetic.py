@@ -0,0 +1,129 @@
+"""
+Generates synthetic exoplanet catalogues shaped like the archive's ``ps`` table.
+
+Each row is one parameter set of a planet, so a planet can appear on
+several rows with different values; only its first row has
+``default_flag = 1``. Columns are missing at roughly the rates of the
+real key dataset, and values follow loosely realistic distributions.
+Output is deterministic for a given size and seed.
+
+    python benchmarks/synthetic.py 100000 synthetic.csv
+"""
+import argparse
+import csv
+import random
+from pathlib import Path
+
+# Fraction of empty cells per column, measured on the archive's key dataset
+MISSING_RATES = {
+    "disc_year": 0.0,
+    "disc_pubdate": 0.0,
+    "sy_dist": 0.022,
+    "discoverymethod": 0.0,
+    "pl_orbper": 0.091,
+    "pl_orbsmax": 0.385,
+    "pl_rade": 0.401,
+    "pl_masse": 0.798,
+    "pl_eqt": 0.578,
+    "pl_insol": 0.638,
+    "st_teff": 0.141,
+    "st_mass": 0.166,
+    "st_rad": 0.156,
+}
+
+# Share of rows that are another parameter set of an earlier planet; the
+# full ps table has about six rows per planet
+DUPLICATE_RATIO = 0.8
+
+COLUMNS = ["pl_name", "hostname", "default_flag", "pl_refname",
+           *MISSING_RATES, "rowupdate"]
+
+METHODS = {
+    "Transit": 0.74,
+    "Radial Velocity": 0.19,
+    "Microlensing": 0.043,
+    "Imaging": 0.015,
+    "Transit Timing Variations": 0.007,
+    "Astrometry": 0.005,
+}
+
+# Column -> (low, high) exponent range of a log-uniform value, or a
+# (low, high) range of a uniform one for the columns in LINEAR
+RANGES = {
+    "sy_dist": (0.5, 3.5),
+    "pl_orbper": (-0.5, 4.0),
+    "pl_orbsmax": (-2.0, 2.0),
+    "pl_rade": (-0.3, 1.3),
+    "pl_masse": (-0.5, 3.5),
+    "pl_eqt": (100.0, 3000.0),
+    "pl_insol": (-2.0, 4.0),
+    "st_teff": (2500.0, 10000.0),
+    "st_mass": (-1.0, 0.5),
+    "st_rad": (-1.0, 1.0),
+}
+LINEAR = {"pl_eqt", "st_teff"}
+
+
+def synthetic_rows(rows, seed=0, duplicate_ratio=DUPLICATE_RATIO):
+    """
+    Yields `rows` catalogue rows as dicts of CSV strings.
+    """
+    rng = random.Random(seed)
+    methods, weights = list(METHODS), list(METHODS.values())
+    planets = []
+
+    for i in range(rows):
+        if planets and rng.random() < duplicate_ratio:
+            name, host, year = rng.choice(planets)
+            default_flag = 0
+        else:
+            host = f"SYN-{len(planets) // 3:06d}"
+            name = f"{host} {'bcd'[len(planets) % 3]}"
+            year = rng.randint(1992, 2025)
+            planets.append((name, host, year))
+            default_flag = 1
+
+        row = {
+            "pl_name": name,
+            "hostname": host,
+            "default_flag": default_flag,
+            "pl_refname": f"Synthetic et al. {i}",
+            "disc_year": year,
+            "disc_pubdate": f"{rng.randint(year, 2025)}-"
+                            f"{rng.randint(1, 12):02d}",
+            "discoverymethod": rng.choices(methods, weights)[0],
+            "rowupdate": f"{rng.randint(2014, 2025)}-"
+                         f"{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+        for column, (low, high) in RANGES.items():
+            if rng.random() < MISSING_RATES[column]:
+                row[column] = ""
+            elif column in LINEAR:
+                row[column] = f"{rng.uniform(low, high):.2f}"
+            else:
+                row[column] = f"{10 ** rng.uniform(low, high):.8f}"
+        yield row
+
+
+def write_catalogue(path, rows, seed=0, duplicate_ratio=DUPLICATE_RATIO):
+    """
+    Writes a synthetic catalogue of `rows` rows to `path` as CSV.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(synthetic_rows(rows, seed, duplicate_ratio))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic ps-shaped exoplanet catalogue.")
+    parser.add_argument("rows", type=int, help="number of rows")
+    parser.add_argument("path", type=Path, help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-ratio", type=float,
+                        default=DUPLICATE_RATIO,
+                        help=f"share of rows repeating an earlier planet "
+                             f"(default: {DUPLICATE_RATIO})")
+    args = parser.parse_args()
+    write_catalogue(args.path, args.rows, args.seed, args.duplicate_ratio)
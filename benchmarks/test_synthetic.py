@@ -0,0 +1,20 @@
+from synthetic import COLUMNS
+from synthetic import MISSING_RATES
+from synthetic import synthetic_rows
+
+
+def test_synthetic_rows_are_deterministic_and_ps_shaped():
+    rows = list(synthetic_rows(20_000, seed=3, duplicate_ratio=0.5))
+
+    assert rows[:50] == list(synthetic_rows(50, seed=3, duplicate_ratio=0.5))
+    assert all(set(row) == set(COLUMNS) for row in rows)
+
+    # One default parameter set per planet
+    defaults = [row["pl_name"] for row in rows if row["default_flag"]]
+    assert len(defaults) == len(set(defaults)) == \
+        len({row["pl_name"] for row in rows})
+    assert 0.45 < 1 - len(defaults) / len(rows) < 0.55
+
+    for column in ("pl_rade", "pl_masse", "sy_dist"):
+        missing = sum(not row[column] for row in rows) / len(rows)
+        assert abs(missing - MISSING_RATES[column]) < 0.02
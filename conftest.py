@@ -0,0 +1,56 @@
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+
+from create_db import insert_sql, migrate  # noqa: E402
+from repository import DISPLAY_COLUMNS  # noqa: E402
+
+
+@pytest.fixture
+def conn():
+    """
+    An in-memory database of 537 synthetic planets.
+    """
+    rng = random.Random(7)
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+
+    def value():
+        # Few distinct values and many NULLs, so ties and gaps are common
+        return rng.choice([None, None, 1.5, 2.0, 3.25, 10.0])
+
+    # The derived display columns are computed by the insert
+    columns = ["pl_name", "sy_dist", "pl_rade", "pl_insol", "pl_masse",
+               "st_mass", "pl_orbper", "disc_year", "disc_pubdate",
+               "discoverymethod", "st_teff"]
+    conn.executemany(
+        insert_sql(columns),
+        [(f"Planet {i:04d}", value(), value(), value(), value(), value(),
+          value(), rng.choice([None, 2001, 2015]),
+          rng.choice([None, "2010-01", "2020-05"]),
+          rng.choice([None, "Transit", "Radial Velocity"]),
+          rng.choice([None, 3000.0, 5780.0]))
+         for i in range(537)],
+    )
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def expected_rows():
+    """
+    Returns a function listing the display rows matching a WHERE clause
+    in the order the GUI sorts a column, computed by plain SQL.
+    """
+    def rows(conn, column, where="1"):
+        return conn.execute(f"""
+            SELECT {", ".join(DISPLAY_COLUMNS)} FROM exoplanets
+            WHERE {where}
+            ORDER BY {column} IS NULL, {column}, pl_name
+        """).fetchall()
+    return rows
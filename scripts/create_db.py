@@ -1,10 +1,7 @@
 import sqlite3
-from pathlib import Path
 
-BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "data"
-
-DB_PATH = DATA_DIR / "exoplanets.db"
+from repository import ALLOWED_ORDER, DB_PATH, FILTER_FIELDS, connect
+from units import DERIVED_COLUMNS, DERIVED_FROM
 
 SCHEMA = """
     CREATE TABLE IF NOT EXISTS exoplanets (
@@ -26,12 +23,253 @@ SCHEMA = """
     );
     """
 
+# Bookkeeping and derived columns, which do not come from the archive
+INTERNAL_COLUMNS = {"id", "row_hash", *DERIVED_COLUMNS}
+
+
+def add_row_hash(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(exoplanets)")}
+    if "row_hash" in existing:
+        return ""
+    return "ALTER TABLE exoplanets ADD COLUMN row_hash TEXT;"
+
+
+def empty_strings_to_null(conn):
+    # Older loaders stored empty CSV cells as '' in numeric columns
+    return "".join(
+        f"UPDATE exoplanets SET {name} = NULL WHERE {name} = '';"
+        for _, name, declared_type, *_ in
+        conn.execute("PRAGMA table_info(exoplanets)")
+        if declared_type.upper() in ("REAL", "INTEGER")
+    )
+
+
+# The GUI's display columns when migration 4 was released
+RELEASE_4_DISPLAY_COLUMNS = [
+    "pl_name", "sy_dist", "pl_rade", "pl_insol", "pl_masse",
+    "st_mass", "pl_orbper", "disc_year", "disc_pubdate",
+]
+
+
+def sort_indexes(conn):
+    # One covering index per GUI sort, matching
+    # ORDER BY col IS NULL, col with pl_name as tie-breaker
+    statements = []
+    for column in RELEASE_4_DISPLAY_COLUMNS:
+        key = [f"{column} IS NULL", column]
+        if column != "pl_name":
+            key.append("pl_name")
+        rest = [name for name in RELEASE_4_DISPLAY_COLUMNS
+                if name not in (column, "pl_name")]
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS idx_exoplanets_{column} "
+            f"ON exoplanets ({', '.join(key + rest)});"
+        )
+    return "".join(statements)
+
+
+def covering_indexes(columns):
+    """
+    Returns a migration rebuilding the covering sort indexes.
+
+    Like `sort_indexes`, with the indexes holding every column in
+    `columns`, the display columns of the release, so a sorted page is
+    still read from the index alone. Indexes left by an earlier version
+    are replaced.
+    """
+    def migration(conn):
+        statements = []
+        for column in columns:
+            key = [f"{column} IS NULL", column]
+            if column != "pl_name":
+                key.append("pl_name")
+            rest = [name for name in columns
+                    if name not in (column, "pl_name")]
+            statements.append(
+                f"DROP INDEX IF EXISTS idx_exoplanets_{column};"
+                f"CREATE INDEX idx_exoplanets_{column} "
+                f"ON exoplanets ({', '.join(key + rest)});"
+            )
+        return "".join(statements)
+    return migration
+
+
+def derived_columns(conn):
+    # Triggers fill the derived columns whenever a row is written, so
+    # every loader keeps them current without computing them itself.
+    # Migration 8 replaces them with `derived_select`.
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(exoplanets)")}
+    statements = [
+        f"ALTER TABLE exoplanets ADD COLUMN {name} {declared_type};"
+        for name, (declared_type, _) in DERIVED_COLUMNS.items()
+        if name not in existing
+    ]
+    update = "UPDATE exoplanets SET " + ", ".join(
+        f"{name} = {expression}"
+        for name, (_, expression) in DERIVED_COLUMNS.items())
+    statements += [
+        f"""CREATE TRIGGER IF NOT EXISTS exoplanets_derive_insert
+        AFTER INSERT ON exoplanets BEGIN
+            {update} WHERE rowid = new.rowid;
+        END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS exoplanets_derive_update
+        AFTER UPDATE OF {", ".join(DERIVED_FROM)} ON exoplanets BEGIN
+            {update} WHERE rowid = new.rowid;
+        END;""",
+        update + ";",
+    ]
+    # The filter-only units; the sortable ones get covering indexes
+    statements += [
+        f"CREATE INDEX IF NOT EXISTS idx_exoplanets_{column} "
+        f"ON exoplanets ({column});"
+        for field, column in FILTER_FIELDS.items()
+        if column in DERIVED_COLUMNS and field not in ALLOWED_ORDER
+    ]
+    return "".join(statements)
+
+
+# Trigram full-text index over the searchable text columns. It is an
+# external-content table, so the text is not stored twice; the triggers
+# keep it in step with every insert, update and delete.
+SEARCH_INDEX = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS exoplanets_fts USING fts5(
+        pl_name, discoverymethod,
+        content='exoplanets', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS exoplanets_fts_insert
+    AFTER INSERT ON exoplanets BEGIN
+        INSERT INTO exoplanets_fts (rowid, pl_name, discoverymethod)
+        VALUES (new.rowid, new.pl_name, new.discoverymethod);
+    END;
+    CREATE TRIGGER IF NOT EXISTS exoplanets_fts_delete
+    AFTER DELETE ON exoplanets BEGIN
+        INSERT INTO exoplanets_fts
+            (exoplanets_fts, rowid, pl_name, discoverymethod)
+        VALUES ('delete', old.rowid, old.pl_name, old.discoverymethod);
+    END;
+    CREATE TRIGGER IF NOT EXISTS exoplanets_fts_update
+    AFTER UPDATE OF pl_name, discoverymethod ON exoplanets BEGIN
+        INSERT INTO exoplanets_fts
+            (exoplanets_fts, rowid, pl_name, discoverymethod)
+        VALUES ('delete', old.rowid, old.pl_name, old.discoverymethod);
+        INSERT INTO exoplanets_fts (rowid, pl_name, discoverymethod)
+        VALUES (new.rowid, new.pl_name, new.discoverymethod);
+    END;
+    INSERT INTO exoplanets_fts (exoplanets_fts) VALUES ('rebuild');
+    """
+
+# The loaders compute the derived columns in their INSERT statements
+# instead, which writes each row and its indexes once instead of twice
+DROP_DERIVE_TRIGGERS = """
+    DROP TRIGGER IF EXISTS exoplanets_derive_insert;
+    DROP TRIGGER IF EXISTS exoplanets_derive_update;
+    """
+
+# Migration N brings a database from user_version N - 1 to N. Each entry
+# is SQL, or a function returning the SQL for the database at hand.
+# Never edit a released migration; append a new one instead.
+MIGRATIONS = [
+    SCHEMA,
+    add_row_hash,
+    empty_strings_to_null,
+    sort_indexes,
+    SEARCH_INDEX,
+    derived_columns,
+    covering_indexes([
+        "pl_name", "sy_dist", "pl_rade", "pl_insol", "pl_masse",
+        "st_mass", "pl_orbper", "disc_year", "disc_pubdate",
+        "pl_dens", "pl_grav", "pl_hz",
+    ]),
+    DROP_DERIVE_TRIGGERS,
+]
+
+
+def migrate(conn):
+    """
+    Applies every pending migration, each in its own transaction.
+
+    The schema version is tracked with ``PRAGMA user_version``, so an
+    existing database is evolved in place instead of being rebuilt.
+
+    Returns the resulting schema version.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for number, migration in enumerate(MIGRATIONS[version:],
+                                       start=version + 1):
+        sql = migration(conn) if callable(migration) else migration
+        try:
+            conn.executescript(
+                f"BEGIN; {sql} PRAGMA user_version = {number}; COMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    return max(version, len(MIGRATIONS))
+
+
+def derived_select(select):
+    """
+    Extends a query over the archive columns with the derived columns.
+
+    `select` must return every column of `DERIVED_FROM`, under its own
+    name. The result holds its columns followed by those of
+    `DERIVED_COLUMNS`, in order, ready for ``INSERT ... SELECT``; an
+    upsert may follow it.
+    """
+    expressions = ", ".join(
+        expression for _, expression in DERIVED_COLUMNS.values())
+    # WHERE true keeps an ON CONFLICT clause after it from being read
+    # as a join constraint
+    return f"SELECT *, {expressions} FROM ({select}) WHERE true"
+
+
+def insert_sql(columns, verb="INSERT"):
+    """
+    Returns a statement inserting one planet, with a ``?`` placeholder
+    for each of `columns`, that also fills the derived columns.
+    """
+    placeholders = ", ".join(f"? AS {name}" for name in columns)
+    return (f"{verb} INTO exoplanets "
+            f"({', '.join([*columns, *DERIVED_COLUMNS])}) "
+            + derived_select(f"SELECT {placeholders}"))
+
+
+def check_schema(conn):
+    """
+    Raises ValueError if the database has migrations pending.
+
+    The GUI and the query service open the database read-only, so they
+    cannot migrate it themselves; `create_database` and the loaders do.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < len(MIGRATIONS):
+        raise ValueError(
+            f"The database has schema version {version} of "
+            f"{len(MIGRATIONS)}. Run scripts/create_db.py or "
+            f"scripts/load_data.py to upgrade it.")
+
+
+def schema_columns():
+    """
+    Returns the archive columns stored in the exoplanets table.
+    """
+    conn = connect(":memory:")
+    migrate(conn)
+    columns = [
+        row[1] for row in conn.execute("PRAGMA table_info(exoplanets)")
+        if row[1] not in INTERNAL_COLUMNS
+    ]
+    conn.close()
+    return columns
+
 
-def create_database():
-    DATA_DIR.mkdir(exist_ok=True)
+def create_database(db_path=DB_PATH):
+    db_path.parent.mkdir(exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.executescript(SCHEMA)
+    conn = connect(db_path)
+    migrate(conn)
     conn.close()
 
     print("Database created successfully.")
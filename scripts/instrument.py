@@ -0,0 +1,289 @@
+"""
+Per-stage timing and memory instrumentation for the pipeline.
+
+Stages are marked with the `traced` decorator or the `stage` context
+manager. Nothing is recorded unless a `session` is enabled, by a
+``--profile`` option of the entry point or by the ``EXOPLANETS_PROFILE``
+environment variable (which child processes inherit, so it also covers
+the scripts run by the GUI refresh). A disabled stage costs one global
+lookup.
+
+For every stage the trace holds the wall and CPU time, the peak
+tracemalloc allocation, the peak RSS of the process and, where the code
+reports it, the number of rows processed. A session writes its trace to
+``<directory>/<program>-<pid>.json``; with ``EXOPLANETS_CPROFILE=1`` (or
+``cprofile=True``) each stage is also profiled with cProfile and dumped
+next to it.
+"""
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILE_DIR = BASE_DIR / "data" / "profile"
+
+ENV_VAR = "EXOPLANETS_PROFILE"
+CPROFILE_ENV_VAR = "EXOPLANETS_CPROFILE"
+
+# The recorder of the enabled session, if any
+_active = None
+
+
+class Stage:
+    """
+    A running stage; code inside it may set `rows`.
+    """
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+
+class _NullStage:
+    """
+    Stands in for `Stage` while instrumentation is disabled.
+    """
+
+    name = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class Recorder:
+    """
+    Collects the records of the stages run in one process.
+
+    Stages may nest: each record names its parent, and the tracemalloc
+    peak of a parent includes the peaks of its children.
+    """
+
+    def __init__(self, program, directory=None, cprofile=False):
+        self.program = program
+        self.directory = Path(directory) if directory else None
+        self.cprofile = cprofile
+        self.started = time.perf_counter()
+        self.records = []
+        self.running = []
+        self.profiling = False
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+        if self.owns_tracemalloc:
+            tracemalloc.start()
+
+    def close(self):
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        current = Stage(name, rows)
+        peak_before = tracemalloc.get_traced_memory()[1]
+        if self.running:
+            parent = self.running[-1]
+            parent.peak = max(parent.peak, peak_before)
+        current.peak = 0
+        tracemalloc.reset_peak()
+        self.running.append(current)
+
+        profiler = None
+        if self.cprofile and not self.profiling:
+            profiler = cProfile.Profile()
+            self.profiling = True
+            profiler.enable()
+
+        start = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield current
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu
+            if profiler:
+                profiler.disable()
+                self.profiling = False
+
+            self.running.pop()
+            peak = max(current.peak, tracemalloc.get_traced_memory()[1])
+            if self.running:
+                parent = self.running[-1]
+                parent.peak = max(parent.peak, peak)
+            tracemalloc.reset_peak()
+
+            record = {
+                "name": name,
+                "parent": self.running[-1].name if self.running else None,
+                "start_s": start - self.started,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "rows": current.rows,
+                "peak_traced_bytes": peak,
+                "max_rss_kib": max_rss_kib(),
+                "pid": os.getpid(),
+            }
+            if profiler and self.directory:
+                record["cprofile"] = str(self.dump_profile(profiler, name))
+            self.records.append(record)
+
+    def dump_profile(self, profiler, name):
+        slug = re.sub(r"[^\w.-]+", "_", name)
+        path = self.directory / (f"{self.program}-{os.getpid()}-"
+                                 f"{len(self.records):02d}-{slug}.prof")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
+        return path
+
+    def write(self):
+        """
+        Writes the trace and returns its path.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.program}-{os.getpid()}.json"
+        trace = {
+            "program": self.program,
+            "argv": sys.argv,
+            "pid": os.getpid(),
+            "wall_s": time.perf_counter() - self.started,
+            "max_rss_kib": max_rss_kib(),
+            "stages": self.records,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def max_rss_kib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def is_enabled():
+    return _active is not None
+
+
+def stage(name, rows=None):
+    """
+    Marks a block of code as a stage; a no-op when disabled.
+
+    Use as ``with stage("load") as s: ...; s.rows = n``.
+    """
+    if _active is None:
+        return NULL_STAGE
+    return _active.stage(name, rows)
+
+
+def traced(name=None, rows=None):
+    """
+    Decorates a function so each call is recorded as a stage.
+
+    `name` defaults to the function name. `rows`, if given, is called
+    with the return value to count the rows processed.
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(stage_name) as current:
+                result = function(*args, **kwargs)
+                if rows is not None:
+                    current.rows = rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def options():
+    """
+    Returns what a worker process needs to record stages, or None.
+    """
+    if _active is None:
+        return None
+    return {"program": _active.program, "cprofile": _active.cprofile,
+            "directory": _active.directory}
+
+
+def run_stage(worker_options, name, function, *args, rows=None):
+    """
+    Runs `function` as a stage in a worker process.
+
+    Returns the result and the records of the stage and of the stages
+    nested in it (empty when disabled), which the parent process adds to
+    its trace with `add_records`.
+    """
+    global _active
+
+    if worker_options is None:
+        return function(*args), []
+
+    previous, _active = _active, Recorder(**worker_options)
+    try:
+        with _active.stage(name, rows):
+            result = function(*args)
+        return result, _active.records
+    finally:
+        _active.close()
+        _active = previous
+
+
+def add_records(records):
+    if _active is not None:
+        _active.records.extend(records)
+
+
+@contextmanager
+def session(program, directory=None, cprofile=None):
+    """
+    Enables instrumentation for the enclosed block and writes the trace.
+
+    `directory` defaults to the ``EXOPLANETS_PROFILE`` environment
+    variable; when neither is set the block runs uninstrumented. A value
+    of ``1`` selects `PROFILE_DIR`.
+    """
+    global _active
+
+    directory = directory or os.environ.get(ENV_VAR)
+    if not directory or _active is not None:
+        yield None
+        return
+
+    if directory == "1":
+        directory = PROFILE_DIR
+    if cprofile is None:
+        cprofile = os.environ.get(CPROFILE_ENV_VAR) == "1"
+
+    _active = Recorder(program, directory, cprofile)
+    try:
+        yield _active
+    finally:
+        recorder, _active = _active, None
+        recorder.close()
+        path = recorder.write()
+        print(f"Profile trace written to {path}", file=sys.stderr)
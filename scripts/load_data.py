@@ -1,42 +1,302 @@
-import sqlite3
+import argparse
+import hashlib
+import os
 import csv
+import time
+from itertools import islice
 from pathlib import Path
 
+import instrument
+from create_db import INTERNAL_COLUMNS, derived_select, insert_sql, migrate
+from progress import report_progress
+from repository import connect
+from units import DERIVED_COLUMNS
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 
 DB_PATH = DATA_DIR / "exoplanets.db"
 CSV_PATH = DATA_DIR / "nasa_exoplanets.csv"
 
+BATCH_SIZE = 5000
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+# Declared column type -> parser for non-empty CSV values
+CONVERTERS = {
+    "INTEGER": to_int,
+    "REAL": float,
+    "TEXT": str,
+}
+
+
+def table_columns(conn):
+    """
+    Returns (name, converter) for each loadable column of exoplanets.
+    """
+    return [
+        (name, CONVERTERS.get(declared_type.upper(), str))
+        for _, name, declared_type, *_ in
+        conn.execute("PRAGMA table_info(exoplanets)")
+        if name not in INTERNAL_COLUMNS
+    ]
+
+
+def convert_rows(reader, columns):
+    """
+    Yields CSV rows as tuples of typed values, with NULL for empty cells.
+    """
+    for row in reader:
+        values = []
+        for name, converter in columns:
+            value = row.get(name)
+            values.append(converter(value) if value else None)
+        yield tuple(values)
+
+
+def row_hash(values):
+    """
+    Fingerprints the content of a converted row.
+    """
+    return hashlib.blake2b(repr(values).encode("utf-8"),
+                           digest_size=16).hexdigest()
 
-def load_data():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    with open(CSV_PATH, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        conn.execute("BEGIN")
-
-        for row in reader:
-            cur.execute("""
-                INSERT OR IGNORE INTO exoplanets (
-                    pl_name, disc_year, disc_pubdate, sy_dist,
-                    discoverymethod, pl_orbper, pl_orbsmax,
-                    pl_rade, pl_masse, pl_eqt, pl_insol,
-                    st_teff, st_mass, st_rad
-                ) VALUES (
-                    :pl_name, :disc_year, :disc_pubdate, :sy_dist,
-                    :discoverymethod, :pl_orbper, :pl_orbsmax,
-                    :pl_rade, :pl_masse, :pl_eqt, :pl_insol,
-                    :st_teff, :st_mass, :st_rad
-                )
-            """, row)
-
-    conn.commit()
-    conn.close()
 
+@instrument.traced(rows=lambda counts: counts["rows"])
+def load_data(csv_path=CSV_PATH, db_path=DB_PATH, batch_size=BATCH_SIZE,
+              mode="merge", progress=None):
+    """
+    Bulk-loads the archive CSV into the exoplanets table.
+
+    Values are converted to the declared column types up front (empty
+    cells become NULL) and inserted with ``executemany`` in batches of
+    `batch_size` rows. Durability is relaxed for the duration of the
+    load and restored afterwards; the load is a single transaction, so
+    an interrupted load still leaves the previous data in place.
+
+    In ``"merge"`` mode (the default) the CSV is loaded into a temporary
+    staging table and compared with the live table by a per-row content
+    hash; only new, changed and removed planets are written. In
+    ``"append"`` mode rows are inserted directly and existing planets
+    are left untouched.
+
+    `progress`, if given, is called as in `report_progress` after every
+    batch.
+
+    Returns a dict with the number of rows read, inserted, updated and
+    deleted.
+    """
+    start = time.perf_counter()
+    conn = connect(db_path)
+    conn.isolation_level = None
+    migrate(conn)
+
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            conn.execute("BEGIN")
+            if mode == "merge":
+                counts = merge_rows(conn, csv.DictReader(f), batch_size,
+                                    progress)
+            else:
+                counts = append_rows(conn, csv.DictReader(f), batch_size,
+                                     progress)
+            conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    rows = counts["rows"]
     print("Data loaded successfully.")
+    print(f"{counts['inserted']} inserted, {counts['updated']} updated, "
+          f"{counts['deleted']} deleted.")
+    print(f"{rows} rows in {elapsed:.2f} s "
+          f"({rows / elapsed if elapsed else 0:,.0f} rows/s).")
+    return counts
+
+
+@instrument.traced()
+def refresh_database(csv_path=CSV_PATH, db_path=DB_PATH,
+                     batch_size=BATCH_SIZE, mode="merge", progress=None):
+    """
+    Loads the CSV into a shadow copy of the database and swaps it in.
+
+    The live database is copied with the SQLite backup API to a
+    ``.new`` file next to it, the CSV is loaded into that copy, and the
+    copy is validated before it atomically replaces the live file.
+    Readers keep their consistent view of the old file until they
+    reconnect, and a failed load or validation leaves the live database
+    untouched.
+
+    Returns the counts reported by `load_data`.
+    """
+    shadow_path = db_path.with_name(db_path.name + ".new")
+    shadow_path.unlink(missing_ok=True)
+
+    try:
+        if progress:
+            progress("copy")
+        if db_path.exists():
+            source = connect(db_path, readonly=True)
+            shadow = connect(shadow_path)
+            source.backup(shadow)
+            shadow.close()
+            source.close()
+
+        counts = load_data(csv_path, shadow_path, batch_size, mode, progress)
+        if progress:
+            progress("validate")
+        validate_database(shadow_path)
+        os.replace(shadow_path, db_path)
+    except BaseException:
+        shadow_path.unlink(missing_ok=True)
+        raise
+
+    print("Database swapped in.")
+    return counts
+
+
+@instrument.traced()
+def validate_database(db_path):
+    """
+    Raises ValueError unless `db_path` is an intact, non-empty database.
+    """
+    conn = connect(db_path, readonly=True)
+    try:
+        check = conn.execute("PRAGMA quick_check").fetchone()[0]
+        count = conn.execute("SELECT count(*) FROM exoplanets").fetchone()[0]
+    finally:
+        conn.close()
+
+    if check != "ok":
+        raise ValueError(f"{db_path.name} failed its integrity check: {check}")
+    if not count:
+        raise ValueError(f"{db_path.name} holds no planets.")
+
+
+def insert_batches(conn, sql, rows, batch_size, progress=None):
+    count = 0
+    while batch := list(islice(rows, batch_size)):
+        conn.executemany(sql, batch)
+        count += len(batch)
+        if progress:
+            progress("load", rows=count)
+    return count
+
+
+def append_rows(conn, reader, batch_size, progress=None):
+    columns = table_columns(conn)
+    before = conn.execute("SELECT count(*) FROM exoplanets").fetchone()[0]
+
+    rows = insert_batches(
+        conn, insert_sql([name for name, _ in columns], "INSERT OR IGNORE"),
+        convert_rows(reader, columns), batch_size, progress)
+
+    after = conn.execute("SELECT count(*) FROM exoplanets").fetchone()[0]
+    return {"rows": rows, "inserted": after - before,
+            "updated": 0, "deleted": 0}
+
+
+def merge_rows(conn, reader, batch_size, progress=None):
+    """
+    Applies the difference between the CSV and the exoplanets table.
+
+    The first row of each planet name wins, as with INSERT OR IGNORE.
+    """
+    columns = table_columns(conn)
+    names = [name for name, _ in columns]
+    column_list = ", ".join(names)
+
+    conn.execute("DROP TABLE IF EXISTS temp.staging")
+    conn.execute(f"""
+        CREATE TEMP TABLE staging AS
+        SELECT {column_list}, row_hash FROM exoplanets WHERE 0
+    """)
+    conn.execute("CREATE UNIQUE INDEX temp.staging_name ON staging(pl_name)")
+
+    name_index = names.index("pl_name")
+    hashed = (
+        values + (row_hash(values),)
+        for values in convert_rows(reader, columns)
+        if values[name_index] is not None
+    )
+    rows = insert_batches(conn, f"""
+        INSERT OR IGNORE INTO temp.staging ({column_list}, row_hash)
+        VALUES ({", ".join("?" for _ in names)}, ?)
+    """, hashed, batch_size, progress)
+    if progress:
+        progress("merge", rows=rows)
+    if not conn.execute("SELECT 1 FROM temp.staging LIMIT 1").fetchone():
+        raise ValueError("The CSV holds no planets; refusing to empty "
+                         "the database.")
+
+    inserted, updated = conn.execute("""
+        SELECT count(*) FILTER (WHERE e.pl_name IS NULL),
+               count(*) FILTER (WHERE e.pl_name IS NOT NULL)
+        FROM temp.staging AS s
+        LEFT JOIN exoplanets AS e ON e.pl_name = s.pl_name
+        WHERE e.row_hash IS NOT s.row_hash
+    """).fetchone()
+
+    deleted = conn.execute("""
+        DELETE FROM exoplanets
+        WHERE pl_name NOT IN (SELECT pl_name FROM temp.staging)
+    """).rowcount
+
+    derived = list(DERIVED_COLUMNS)
+    assignments = ", ".join(
+        f"{name} = excluded.{name}"
+        for name in names + ["row_hash"] + derived if name != "pl_name"
+    )
+    changed = derived_select(f"""
+        SELECT {", ".join("s." + name for name in names)}, s.row_hash
+        FROM temp.staging AS s
+        LEFT JOIN exoplanets AS e ON e.pl_name = s.pl_name
+        WHERE e.row_hash IS NOT s.row_hash
+    """)
+    conn.execute(f"""
+        INSERT INTO exoplanets ({column_list}, row_hash, {", ".join(derived)})
+        {changed}
+        ON CONFLICT (pl_name) DO UPDATE SET {assignments}
+    """)
+    conn.execute("DROP TABLE temp.staging")
+
+    return {"rows": rows, "inserted": inserted,
+            "updated": updated, "deleted": deleted}
 
 
 if __name__ == "__main__":
-    load_data()
+    parser = argparse.ArgumentParser(
+        description="Load the NASA exoplanet CSV into the database.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"rows per executemany call "
+                             f"(default: {BATCH_SIZE})")
+    parser.add_argument("--mode", choices=("merge", "append"),
+                        default="merge",
+                        help="merge: apply inserts, updates and deletes "
+                             "(default); append: only add new planets")
+    parser.add_argument("--progress", action="store_true",
+                        help="print machine-readable progress events")
+    parser.add_argument("--profile", nargs="?", const="1", metavar="DIR",
+                        help="write a per-stage time and memory trace to "
+                             "DIR (default: data/profile)")
+    args = parser.parse_args()
+    with instrument.session("load_data", args.profile):
+        refresh_database(batch_size=args.batch_size, mode=args.mode,
+                         progress=report_progress if args.progress else None)
@@ -0,0 +1,23 @@
+import json
+
+# Lines starting with this marker are progress events, not log output
+PREFIX = "PROGRESS "
+
+
+def report_progress(phase, **counts):
+    """
+    Prints a progress event as a single JSON line.
+
+    The GUI runs the scripts with ``--progress`` and parses these lines
+    from their output; see `parse_progress`.
+    """
+    print(PREFIX + json.dumps({"phase": phase, **counts}), flush=True)
+
+
+def parse_progress(line):
+    """
+    Returns the event printed by `report_progress`, or None for log lines.
+    """
+    if not line.startswith(PREFIX):
+        return None
+    return json.loads(line[len(PREFIX):])
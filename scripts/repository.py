@@ -0,0 +1,388 @@
+import queue
+import re
+import shlex
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
+
+DB_PATH = DATA_DIR / "exoplanets.db"
+
+# Connection tuning, applied to every connection opened here
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 16 * 1024
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 4
+
+# Columns shown by the GUI, in display order; the last three are
+# derived by the database (see units.DERIVED_COLUMNS)
+DISPLAY_COLUMNS = [
+    "pl_name", "sy_dist", "pl_rade", "pl_insol", "pl_masse",
+    "st_mass", "pl_orbper", "disc_year", "disc_pubdate",
+    "pl_dens", "pl_grav", "pl_hz",
+]
+
+ALLOWED_ORDER = {
+    "name": "pl_name",
+    "distance": "sy_dist",
+    "size": "pl_rade",
+    "insolation": "pl_insol",
+    "mass": "pl_masse",
+    "orbital_period": "pl_orbper",
+    "discovery_year": "disc_year",
+    "publication_date": "disc_pubdate",
+    "star_mass": "st_mass",
+    "density": "pl_dens",
+    "gravity": "pl_grav",
+    "habitable_zone": "pl_hz",
+}
+
+# Fields of the filter bar: the sort keys and the other units
+FILTER_FIELDS = {
+    **ALLOWED_ORDER,
+    "distance_ly": "sy_dist_ly",
+    "distance_au": "sy_dist_au",
+    "distance_km": "sy_dist_km",
+    "radius_km": "pl_rade_km",
+    "mass_kg": "pl_masse_kg",
+    "insolation_wm2": "pl_insol_wm2",
+    "period_years": "pl_orbper_years",
+    "star_mass_kg": "st_mass_kg",
+}
+
+# Sort columns compared as text by range filters
+TEXT_COLUMNS = {"pl_name", "disc_pubdate"}
+
+PAGE_SIZE = 100
+MAX_CACHED_PAGES = 20
+
+
+def connect(db_path=DB_PATH, readonly=False, check_same_thread=True):
+    """
+    Opens the database with the tuning shared by every caller.
+
+    Readers pass ``readonly=True`` to open a ``mode=ro`` URI, which can
+    neither write nor create the file. Prepared statements are cached per
+    connection, keyed by their SQL text, so queries should bind their
+    values as parameters instead of formatting them in.
+    """
+    if readonly:
+        target, uri = f"file:{Path(db_path).resolve()}?mode=ro", True
+    else:
+        target, uri = db_path, False
+
+    conn = sqlite3.connect(target, uri=uri,
+                           cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+class ConnectionPool:
+    """
+    A fixed number of connections shared by several threads.
+
+    Connections are opened on first use, up to `size`; a thread asking
+    for one while all are busy waits until another thread returns one.
+    """
+
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE, readonly=True):
+        self.db_path = db_path
+        self.size = size
+        self.readonly = readonly
+        self.idle = queue.LifoQueue()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if len(self.opened) < self.size:
+                conn = connect(self.db_path, self.readonly,
+                               check_same_thread=False)
+                self.opened.append(conn)
+                return conn
+        return self.idle.get()
+
+    def open(self):
+        """
+        Opens every connection now rather than on first use.
+
+        All of them then read the file found at `db_path` at this time,
+        even if a refresh renames another one over it later.
+        """
+        with self.lock:
+            while len(self.opened) < self.size:
+                conn = connect(self.db_path, self.readonly,
+                               check_same_thread=False)
+                self.opened.append(conn)
+                self.idle.put(conn)
+
+    def close(self):
+        with self.lock:
+            for conn in self.opened:
+                conn.close()
+            self.opened.clear()
+
+
+def database_generation(db_path=DB_PATH):
+    """
+    Identifies the current database file.
+
+    A refresh builds a new file and renames it over the old one, so the
+    inode (or, for in-place writes, the modification time) changes.
+    """
+    stat = db_path.stat()
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def display_rows(conn):
+    """
+    Returns every planet as a tuple of `DISPLAY_COLUMNS`, in table order.
+    """
+    return conn.execute(
+        f"SELECT {', '.join(DISPLAY_COLUMNS)} FROM exoplanets").fetchall()
+
+
+class PagedQuery:
+    """
+    Reads the exoplanets table in one sort order, a page at a time.
+
+    Pages are fetched with keyset pagination: a page starts right after
+    the (value, pl_name) key of the previous page's last row, which the
+    sort index can seek to directly. Jumping to a page whose predecessor
+    was never read falls back to LIMIT/OFFSET. Only the most recently
+    used pages are kept in memory.
+
+    `where` and `params` restrict the rows, as built by `filter_clause`;
+    the filter and the sort run as one statement. Rows without a value
+    come last, ordered by name, in either direction.
+    """
+
+    def __init__(self, conn, order_key, page_size=PAGE_SIZE,
+                 descending=False, where="", params=()):
+        self.conn = conn
+        self.column = ALLOWED_ORDER[order_key]
+        self.page_size = page_size
+        self.descending = descending
+        self.where = where
+        self.params = list(params)
+
+        # count(column) counts the rows that have a value
+        self.count, self.present = conn.execute(f"""
+            SELECT count(*), count({self.column}) FROM exoplanets
+            {"WHERE " + where if where else ""}
+        """, self.params).fetchone()
+
+        self.pages = OrderedDict()
+        # Page number -> sort key of its last row, kept for every page read
+        self.bookmarks = {}
+
+        self.order = [self.column]
+        if self.column != "pl_name":
+            self.order.append("pl_name")
+        self.select = f"SELECT {', '.join(DISPLAY_COLUMNS)} FROM exoplanets"
+
+    def rows(self, start, stop):
+        """
+        Returns the rows at positions start to stop in sort order.
+        """
+        start = max(start, 0)
+        stop = min(stop, self.count)
+        rows = []
+        for number in range(start // self.page_size,
+                            (stop - 1) // self.page_size + 1):
+            first = number * self.page_size
+            page = self.page(number)
+            rows.extend(page[max(start - first, 0):stop - first])
+        return rows
+
+    def page(self, number):
+        if number in self.pages:
+            self.pages.move_to_end(number)
+            return self.pages[number]
+
+        if number == 0:
+            rows = self.fetch_offset(0)
+        elif number - 1 in self.bookmarks:
+            rows = self.fetch_after(self.bookmarks[number - 1])
+        else:
+            rows = self.fetch_offset(number * self.page_size)
+
+        self.pages[number] = rows
+        if rows:
+            last = rows[-1]
+            self.bookmarks[number] = (last[DISPLAY_COLUMNS.index(self.column)],
+                                      last[0])
+        while len(self.pages) > MAX_CACHED_PAGES:
+            self.pages.popitem(last=False)
+        return rows
+
+    def fetch_offset(self, offset):
+        """
+        Returns the page starting at position `offset`.
+        """
+        if offset >= self.present:
+            return self.fetch(*self.range_query(
+                missing=True, offset=offset - self.present))
+
+        rows = self.fetch(*self.range_query(offset=offset))
+        if len(rows) < self.page_size:
+            rows += self.fetch(*self.range_query(
+                missing=True, limit=self.page_size - len(rows)))
+        return rows
+
+    def fetch_after(self, key):
+        """
+        Returns the page following the row with sort key (value, name).
+
+        Rows with a value and rows without one are separate ranges of
+        the sort index, so each is read with its own query.
+        """
+        value, name = key
+        rows = []
+        if value is not None:
+            rows = self.fetch(*self.range_query(after=key))
+            if len(rows) == self.page_size:
+                return rows
+            name = None
+
+        return rows + self.fetch(*self.range_query(
+            missing=True, after=(None, name),
+            limit=self.page_size - len(rows)))
+
+    def fetch(self, sql, params):
+        return self.conn.execute(sql, params).fetchall()
+
+    def range_query(self, missing=False, after=None, limit=None, offset=0):
+        """
+        Builds the SQL for a page of the rows with or without a value.
+
+        `after` is the (value, name) key the page starts after; a name
+        of None (or no key) starts at the first row of the range.
+        """
+        limit = self.page_size if limit is None else limit
+        column = self.column
+        name = after[1] if after else None
+
+        where = [f"({column} IS NULL) = {int(missing)}"]
+        params = []
+        if missing:
+            # Rows without a value are always ordered by name
+            direction, order = "", [column, "pl_name"]
+            if name is not None:
+                where.append("pl_name > ?")
+                params.append(name)
+        else:
+            direction, order = " DESC" if self.descending else "", self.order
+            comparison = "<" if self.descending else ">"
+            if after and column == "pl_name":
+                where.append(f"{column} {comparison} ?")
+                params.append(after[0])
+            elif after:
+                where.append(f"({column}, pl_name) {comparison} (?, ?)")
+                params.extend(after)
+
+        if self.where:
+            where.append(f"({self.where})")
+            params.extend(self.params)
+
+        sql = f"""
+            {self.select}
+            WHERE {" AND ".join(where)}
+            ORDER BY {", ".join(name + direction for name in order)}
+            LIMIT ? OFFSET ?
+        """
+        return sql, params + [limit, offset]
+
+
+def filter_clause(text):
+    """
+    Translates the text of the filter bar into a WHERE clause.
+
+    The text is a list of terms, separated by spaces (quote a term to
+    keep its spaces):
+
+    - ``field:low..high`` keeps rows with a value in the range, bounds
+      included; either bound may be left out (``insolation:..2``), and
+      ``field:value`` keeps rows equal to the value. The fields are
+      those of `FILTER_FIELDS`.
+    - A term with ``*`` or ``?`` wildcards matches whole planet names
+      (``Kepler-*``).
+    - Any other term matches part of the planet name or the discovery
+      method (``transit``).
+
+    Text terms are answered by the trigram index ``exoplanets_fts``.
+    Matching ignores case.
+
+    Returns the clause and its parameters, ("", []) for an empty filter.
+    Raises ValueError for text that cannot be parsed.
+    """
+    conditions = []
+    params = []
+    for term in shlex.split(text):
+        field, colon, bounds = term.partition(":")
+        if colon and field in FILTER_FIELDS:
+            column = FILTER_FIELDS[field]
+            low, dots, high = bounds.partition("..")
+            if not dots:
+                high = low
+            for bound, operator in ((low, ">="), (high, "<=")):
+                if bound:
+                    conditions.append(f"{column} {operator} ?")
+                    params.append(filter_value(column, bound))
+            continue
+        if colon:
+            raise ValueError(f"Unknown filter field: {field}")
+
+        if "*" in term or "?" in term:
+            escaped = re.sub(r"([%_\\])", r"\\\1", term)
+            pattern = escaped.replace("*", "%").replace("?", "_")
+            # An ESCAPE clause keeps the trigram index from answering
+            # the LIKE, so add it only for terms that need one
+            escape = " ESCAPE '\\'" if escaped != term else ""
+            conditions.append(
+                "rowid IN (SELECT rowid FROM exoplanets_fts "
+                f"WHERE pl_name LIKE ?{escape})")
+            params.append(pattern)
+        elif len(term) >= 3:
+            conditions.append(
+                "rowid IN (SELECT rowid FROM exoplanets_fts "
+                "WHERE exoplanets_fts MATCH ?)")
+            params.append('"' + term.replace('"', '""') + '"')
+        else:
+            # Too short for a trigram
+            pattern = "%" + re.sub(r"([%_\\])", r"\\\1", term) + "%"
+            conditions.append(
+                "(pl_name LIKE ? ESCAPE '\\' "
+                "OR discoverymethod LIKE ? ESCAPE '\\')")
+            params.extend([pattern, pattern])
+
+    return " AND ".join(conditions), params
+
+
+def filter_value(column, text):
+    if column in TEXT_COLUMNS:
+        return text
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Not a number: {text}") from None
@@ -0,0 +1,322 @@
+"""
+Finds the planets most similar to a given one in parameter space.
+
+Planets are compared on the logarithms of `FEATURES`, each scaled to
+unit variance over the table, so every feature weighs alike whatever
+its units and range. Distances are the root mean square of the
+per-feature differences.
+
+Many planets lack some parameters. A planet is compared on the features
+it has, against the planets that have all of them: the index keeps one
+KD-tree per combination of features, holding every planet with at least
+those features. The index is saved next to the database and reused
+until the database changes.
+
+    python scripts/similarity.py "Kepler-22 b" -k 10
+"""
+import argparse
+import heapq
+import math
+import os
+import pickle
+from itertools import combinations
+
+from repository import DATA_DIR, DB_PATH, connect, database_generation
+
+FEATURES = ["pl_masse", "pl_rade", "pl_orbper", "pl_insol"]
+
+INDEX_PATH = DATA_DIR / "similarity.pickle"
+# Bump when the layout of a saved index changes
+INDEX_VERSION = 1
+
+# Points below which a subtree is scanned instead of split
+LEAF_SIZE = 8
+
+
+class KDTree:
+    """
+    A static KD-tree over points of equal dimension.
+
+    The tree is implicit: building reorders the point indices so that
+    every subtree is a slice whose middle element splits it, on the
+    dimension recorded for that position.
+
+    Parameters
+    ----------
+    points : list of tuple of float
+        Coordinates of each point.
+    """
+
+    def __init__(self, points):
+        self.points = points
+        self.order = list(range(len(points)))
+        self.split_dims = [0] * len(points)
+        self._build(0, len(points))
+
+    def _build(self, lo, hi):
+        if hi - lo <= LEAF_SIZE:
+            return
+        points = self.points
+        segment = self.order[lo:hi]
+        # Split on the dimension with the widest spread
+        dim = max(range(len(points[segment[0]])), key=lambda d: (
+            max(points[i][d] for i in segment)
+            - min(points[i][d] for i in segment)))
+        segment.sort(key=lambda i: points[i][dim])
+        self.order[lo:hi] = segment
+        mid = (lo + hi) // 2
+        self.split_dims[mid] = dim
+        self._build(lo, mid)
+        self._build(mid + 1, hi)
+
+    def nearest(self, target, k):
+        """
+        Returns the k nearest points as (squared distance, index) pairs,
+        nearest first.
+        """
+        if k <= 0:
+            return []
+        # Max-heap of the best k so far, as (-distance, -index)
+        best = []
+
+        def visit(i):
+            distance = _squared_distance(self.points[i], target)
+            if len(best) < k:
+                heapq.heappush(best, (-distance, -i))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, -i))
+
+        def bound():
+            return -best[0][0] if len(best) == k else math.inf
+
+        self._search(0, len(self.points), target, visit, bound)
+        return sorted((-distance, -i) for distance, i in best)
+
+    def within(self, target, radius_squared):
+        """
+        Returns the points within a squared distance, as (squared
+        distance, index) pairs, nearest first.
+        """
+        found = []
+
+        def visit(i):
+            distance = _squared_distance(self.points[i], target)
+            if distance <= radius_squared:
+                found.append((distance, i))
+
+        self._search(0, len(self.points), target, visit,
+                     lambda: radius_squared)
+        return sorted(found)
+
+    def _search(self, lo, hi, target, visit, bound):
+        if hi - lo <= LEAF_SIZE:
+            for i in self.order[lo:hi]:
+                visit(i)
+            return
+        mid = (lo + hi) // 2
+        dim = self.split_dims[mid]
+        index = self.order[mid]
+        difference = target[dim] - self.points[index][dim]
+        if difference < 0:
+            near, far = (lo, mid), (mid + 1, hi)
+        else:
+            near, far = (mid + 1, hi), (lo, mid)
+
+        visit(index)
+        self._search(*near, target, visit, bound)
+        # The far side can only hold closer points if the splitting
+        # plane is closer than the current bound
+        if difference * difference <= bound():
+            self._search(*far, target, visit, bound)
+
+
+def _squared_distance(a, b):
+    return sum((x - y) * (x - y) for x, y in zip(a, b))
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour search over the planets of the database.
+
+    Attributes
+    ----------
+    names : list of str
+        Planet names, by planet number.
+    coordinates : list of dict
+        Scaled coordinates of each planet, by feature; a missing
+        feature is absent.
+    scales : dict
+        Maps each feature to the (mean, standard deviation) of its
+        logarithm.
+    trees : dict
+        Maps each combination of features (a tuple in `FEATURES` order)
+        to its KD-tree and the planet numbers of its points.
+    generation : tuple
+        The `database_generation` the index was built from.
+    """
+
+    def __init__(self, names, values, generation=None):
+        self.names = names
+        self.generation = generation
+        self.positions = {name: number for number, name in enumerate(names)}
+
+        logs = [{feature: math.log10(value)
+                 for feature, value in zip(FEATURES, row)
+                 if value is not None and value > 0}
+                for row in values]
+        self.scales = {}
+        for feature in FEATURES:
+            column = [log[feature] for log in logs if feature in log]
+            mean = sum(column) / len(column) if column else 0.0
+            variance = sum((x - mean) ** 2 for x in column) / len(column) \
+                if column else 0.0
+            self.scales[feature] = (mean, math.sqrt(variance) or 1.0)
+        self.coordinates = [
+            {feature: (value - self.scales[feature][0])
+             / self.scales[feature][1] for feature, value in log.items()}
+            for log in logs]
+
+        self.trees = {}
+        for size in range(1, len(FEATURES) + 1):
+            for combination in combinations(FEATURES, size):
+                members = [number for number, point
+                           in enumerate(self.coordinates)
+                           if all(feature in point for feature in combination)]
+                if members:
+                    points = [tuple(self.coordinates[number][feature]
+                                    for feature in combination)
+                              for number in members]
+                    self.trees[combination] = (KDTree(points), members)
+
+    @classmethod
+    def build(cls, conn, generation=None):
+        """
+        Builds the index from the exoplanets table.
+        """
+        rows = conn.execute(
+            f"SELECT pl_name, {', '.join(FEATURES)} FROM exoplanets "
+            f"ORDER BY pl_name").fetchall()
+        return cls([row[0] for row in rows], [row[1:] for row in rows],
+                   generation)
+
+    @classmethod
+    def open(cls, db_path=DB_PATH, path=INDEX_PATH):
+        """
+        Loads the saved index, or builds and saves it if it is missing
+        or older than the database.
+        """
+        generation = database_generation(db_path)
+        try:
+            with open(path, "rb") as f:
+                version, index = pickle.load(f)
+            if version == INDEX_VERSION and index.generation == generation:
+                return index
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError,
+                AttributeError, ValueError):
+            pass
+
+        conn = connect(db_path, readonly=True)
+        try:
+            index = cls.build(conn, generation)
+        finally:
+            conn.close()
+        index.save(path)
+        return index
+
+    def save(self, path=INDEX_PATH):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((INDEX_VERSION, self), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def nearest(self, name, k=10, features=None):
+        """
+        Returns the k planets most similar to a planet.
+
+        Parameters
+        ----------
+        name : str
+            Planet to compare with; it is left out of the results.
+        k : int
+            Number of planets returned.
+        features : list of str, optional
+            Features compared; defaults to those the planet has.
+
+        Returns
+        -------
+        list of (str, float)
+            Planet names and distances, nearest first.
+
+        Raises
+        ------
+        ValueError
+            If `k` is not positive, or the planet is unknown or lacks
+            every compared feature.
+        """
+        if k < 1:
+            raise ValueError(f"k must be a positive integer, got {k}")
+        combination, target = self._target(name, features)
+        tree, members = self.trees[combination]
+        own = self.positions[name]
+        found = tree.nearest(target, k + 1)
+        return self._results(found, members, combination, own)[:k]
+
+    def within(self, name, radius, features=None):
+        """
+        Returns the planets within a distance of a planet, nearest first.
+
+        Takes the same arguments as `nearest`, with the largest distance
+        instead of a count.
+        """
+        combination, target = self._target(name, features)
+        tree, members = self.trees[combination]
+        found = tree.within(target, radius * radius * len(combination))
+        return self._results(found, members, combination,
+                             self.positions[name])
+
+    def _target(self, name, features):
+        if name not in self.positions:
+            # The index may come from a newer database than the caller's
+            raise ValueError(f"{name} is not in the similarity index")
+        point = self.coordinates[self.positions[name]]
+        wanted = features or FEATURES
+        combination = tuple(feature for feature in FEATURES
+                            if feature in wanted and feature in point)
+        if combination not in self.trees:
+            raise ValueError(f"{name} has none of the compared features")
+        return combination, tuple(point[feature] for feature in combination)
+
+    def _results(self, found, members, combination, own):
+        return [(self.names[members[i]],
+                 math.sqrt(distance / len(combination)))
+                for distance, i in found if members[i] != own]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the planets most similar to a planet.")
+    parser.add_argument("name", help="planet name, e.g. 'Kepler-22 b'")
+    parser.add_argument("-k", type=int, default=10,
+                        help="planets listed (default: 10)")
+    parser.add_argument("--radius", type=float,
+                        help="list every planet within this distance "
+                             "instead")
+    parser.add_argument("--features", nargs="+", choices=FEATURES,
+                        help="features compared (default: all the "
+                             "planet has)")
+    args = parser.parse_args()
+
+    # Load the class by its module name, so the saved index is shared
+    # with the GUI
+    from similarity import SimilarityIndex as Index
+    index = Index.open()
+    try:
+        if args.radius is not None:
+            results = index.within(args.name, args.radius, args.features)
+        else:
+            results = index.nearest(args.name, args.k, args.features)
+    except ValueError as error:
+        parser.error(str(error))
+    for name, distance in results:
+        print(f"{distance:8.3f}  {name}")
@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+from create_db import MIGRATIONS
+from create_db import check_schema
+from create_db import create_database
+from create_db import insert_sql
+from create_db import migrate
+from repository import DISPLAY_COLUMNS
+from units import in_habitable_zone
+
+
+LEGACY_SCHEMA = """
+    CREATE TABLE exoplanets (
+        pl_name TEXT PRIMARY KEY, disc_year INTEGER, disc_pubdate TEXT,
+        sy_dist REAL, discoverymethod TEXT, pl_orbper REAL, pl_orbsmax REAL,
+        pl_rade REAL, pl_masse REAL, pl_eqt REAL, pl_insol REAL,
+        st_teff REAL, st_mass REAL, st_rad REAL
+    );
+    INSERT INTO exoplanets (pl_name, sy_dist, pl_insol)
+    VALUES ('A b', '', 1.5);
+"""
+
+
+def test_create_database_applies_every_migration(tmp_path):
+    db_path = tmp_path / "exoplanets.db"
+
+    create_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == \
+        len(MIGRATIONS)
+    assert migrate(conn) == len(MIGRATIONS)
+    conn.close()
+
+
+def test_migrate_upgrades_existing_database_in_place(tmp_path):
+    conn = sqlite3.connect(tmp_path / "exoplanets.db")
+    conn.executescript(LEGACY_SCHEMA)
+
+    migrate(conn)
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(exoplanets)")]
+    assert "row_hash" in columns
+    assert conn.execute("SELECT sy_dist, pl_insol FROM exoplanets") \
+        .fetchone() == (None, 1.5)
+    conn.close()
+
+
+@pytest.mark.parametrize("column", DISPLAY_COLUMNS)
+def test_sort_queries_use_covering_index(tmp_path, column):
+    conn = sqlite3.connect(tmp_path / "exoplanets.db")
+    migrate(conn)
+
+    plan = " ".join(row[3] for row in conn.execute(f"""
+        EXPLAIN QUERY PLAN
+        SELECT {", ".join(DISPLAY_COLUMNS)}
+        FROM exoplanets
+        ORDER BY {column} IS NULL, {column}
+    """))
+    conn.close()
+
+    assert f"USING COVERING INDEX idx_exoplanets_{column}" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_search_index_follows_table_changes(tmp_path):
+    conn = sqlite3.connect(tmp_path / "exoplanets.db")
+    conn.executescript(LEGACY_SCHEMA)
+    migrate(conn)
+
+    def search(term):
+        return [row[0] for row in conn.execute(
+            "SELECT pl_name FROM exoplanets_fts WHERE exoplanets_fts MATCH ?",
+            (f'"{term}"',))]
+
+    assert search("a b") == ["A b"]
+    conn.execute("INSERT INTO exoplanets (pl_name, discoverymethod) "
+                 "VALUES ('Kepler-22 b', 'Transit')")
+    conn.execute("UPDATE exoplanets SET pl_name = 'Kepler-22 c' "
+                 "WHERE pl_name = 'Kepler-22 b'")
+    conn.execute("DELETE FROM exoplanets WHERE pl_name = 'A b'")
+
+    assert search("kepler") == ["Kepler-22 c"]
+    assert search("transit") == ["Kepler-22 c"]
+    assert search("a b") == []
+    conn.close()
+
+
+def test_derived_columns_follow_the_archive_values(tmp_path):
+    conn = sqlite3.connect(tmp_path / "exoplanets.db")
+    conn.executescript(LEGACY_SCHEMA)
+    migrate(conn)
+    conn.executemany(
+        insert_sql(["pl_name", "sy_dist", "pl_rade", "pl_masse", "pl_insol",
+                    "pl_orbper", "st_mass", "st_teff"]),
+        [("Earth", 1.0, 1.0, 1.0, 1.0, None, None, 5780.0),
+         ("Hot", None, 2.0, 8.0, 2.0, None, None, 5780.0),
+         ("Cold star", None, None, 1.0, 1.0, None, None, 2000.0)])
+
+    rows = conn.execute("""
+        SELECT pl_name, sy_dist_ly, pl_dens, pl_grav, pl_hz, pl_insol, st_teff
+        FROM exoplanets ORDER BY pl_name
+    """).fetchall()
+    assert [row[:5] for row in rows] == [
+        ("A b", None, None, None, None),
+        ("Cold star", None, None, None, None),
+        ("Earth", 3.26156, 5.514, 9.807, 1),
+        ("Hot", None, 5.514, 19.613, 0),
+    ]
+    for *_, hz, insolation, teff in rows:
+        expected = in_habitable_zone(insolation, teff)
+        assert hz == (None if expected is None else int(expected))
+    conn.close()
+
+
+def test_check_schema_rejects_pending_migrations(tmp_path):
+    conn = sqlite3.connect(tmp_path / "exoplanets.db")
+    conn.executescript(LEGACY_SCHEMA)
+
+    with pytest.raises(ValueError, match="schema version 0"):
+        check_schema(conn)
+    migrate(conn)
+    check_schema(conn)
+    conn.close()
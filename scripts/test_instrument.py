@@ -0,0 +1,69 @@
+import json
+
+import instrument
+
+
+@instrument.traced(rows=len)
+def make_rows(n):
+    return [str(i) * 10 for i in range(n)]
+
+
+def test_disabled_instrumentation_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.delenv(instrument.ENV_VAR, raising=False)
+
+    with instrument.session("test") as recorder:
+        with instrument.stage("outer") as stage:
+            stage.rows = 5
+            assert make_rows(3) == ["0" * 10, "1" * 10, "2" * 10]
+
+    assert recorder is None
+    assert not instrument.is_enabled()
+    assert instrument.options() is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_session_writes_nested_stages(tmp_path):
+    with instrument.session("test", tmp_path, cprofile=True):
+        with instrument.stage("outer") as stage:
+            make_rows(50_000)
+            stage.rows = 1
+
+        result, records = instrument.run_stage(
+            instrument.options(), "worker", make_rows, 10, rows=10)
+        instrument.add_records(records)
+
+    assert len(result) == 10
+    trace_path, = tmp_path.glob("test-*.json")
+    with open(trace_path, encoding="utf-8") as f:
+        trace = json.load(f)
+
+    assert [(stage["name"], stage["parent"]) for stage in trace["stages"]] \
+        == [("make_rows", "outer"), ("outer", None),
+            ("make_rows", "worker"), ("worker", None)]
+    stages = {stage["name"]: stage for stage in trace["stages"][:2]}
+    stages["worker"] = trace["stages"][3]
+    assert stages["make_rows"]["parent"] == "outer"
+    assert stages["make_rows"]["rows"] == 50_000
+    assert stages["outer"]["rows"] == 1
+    assert stages["outer"]["peak_traced_bytes"] >= \
+        stages["make_rows"]["peak_traced_bytes"] > 50_000 * 10
+    assert stages["outer"]["wall_s"] >= stages["make_rows"]["wall_s"] > 0
+    assert stages["outer"]["cpu_s"] >= 0
+    assert stages["worker"]["rows"] == 10
+
+    # Only the outermost stages are profiled
+    assert "cprofile" not in stages["make_rows"]
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+    assert not instrument.is_enabled()
+
+
+def test_environment_variable_enables_a_session(tmp_path, monkeypatch):
+    monkeypatch.setenv(instrument.ENV_VAR, str(tmp_path))
+
+    with instrument.session("env"):
+        make_rows(2)
+
+    trace_path, = tmp_path.glob("env-*.json")
+    with open(trace_path, encoding="utf-8") as f:
+        assert [stage["name"] for stage in json.load(f)["stages"]] == \
+            ["make_rows"]
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+from create_db import create_database
+from load_data import load_data
+from load_data import refresh_database
+
+
+CSV = (
+    "pl_name,disc_year,disc_pubdate,sy_dist,discoverymethod,pl_orbper,"
+    "pl_orbsmax,pl_rade,pl_masse,pl_eqt,pl_insol,st_teff,st_mass,st_rad,"
+    "rowupdate\n"
+    "A b,2011,2011-07,213.9,Transit,4.05,0.04,14.2,88.9,,,5400,0.93,0.89,"
+    "2020-01-01\n"
+    "B c,2006,2007-02,,Imaging,,,,,1306,1.5,,1.1,,2020-01-01\n"
+    "A b,2012,2012-01,1.0,Transit,,,,,,,,,,2020-01-01\n"
+)
+
+
+def make_database(tmp_path, csv_text=CSV):
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    csv_path.write_text(csv_text, encoding="utf-8")
+    db_path = tmp_path / "exoplanets.db"
+    create_database(db_path)
+    return csv_path, db_path
+
+
+def test_load_data_converts_types_and_empty_values(tmp_path):
+    csv_path, db_path = make_database(tmp_path)
+
+    counts = load_data(csv_path, db_path, batch_size=2)
+
+    assert counts == {"rows": 3, "inserted": 2, "updated": 0, "deleted": 0}
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT pl_name, typeof(disc_year), typeof(sy_dist), pl_insol
+        FROM exoplanets ORDER BY pl_name
+    """).fetchall()
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+
+    assert rows == [
+        ("A b", "integer", "real", None),
+        ("B c", "integer", "null", 1.5),
+    ]
+    assert journal_mode == "delete"
+
+
+def test_merge_applies_only_changed_rows(tmp_path):
+    csv_path, db_path = make_database(tmp_path)
+    load_data(csv_path, db_path)
+
+    csv_path.write_text(
+        CSV.splitlines(keepends=True)[0]
+        + "A b,2011,2011-07,213.9,Transit,4.05,0.04,14.2,88.9,,,5400,0.93,"
+          "0.89,2020-01-01\n"
+        + "C d,2020,2020-01,,Transit,,,,,,,,,,2020-01-01\n"
+        + "B c,2006,2007-02,,Imaging,,,,,1306,1.7,,1.1,,2021-01-01\n",
+        encoding="utf-8",
+    )
+    assert load_data(csv_path, db_path) == \
+        {"rows": 3, "inserted": 1, "updated": 1, "deleted": 0}
+    conn = sqlite3.connect(db_path)
+    # The derived columns follow the updated values
+    assert conn.execute("""
+        SELECT pl_insol_wm2 FROM exoplanets WHERE pl_name = 'B c'
+    """).fetchone() == (pytest.approx(1.7 * 1361),)
+    conn.close()
+    csv_path.write_text(CSV.splitlines(keepends=True)[0]
+                        + "C d,2021,2020-01,,Transit,,,,,,,,,,\n",
+                        encoding="utf-8")
+
+    counts = load_data(csv_path, db_path)
+
+    assert counts == {"rows": 1, "inserted": 0, "updated": 1, "deleted": 2}
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT pl_name, disc_year FROM exoplanets") \
+        .fetchall() == [("C d", 2021)]
+    conn.close()
+
+
+@pytest.mark.parametrize("mode", ["merge", "append"])
+def test_loads_fill_the_derived_columns(tmp_path, mode):
+    csv_path, db_path = make_database(tmp_path)
+
+    load_data(csv_path, db_path, mode=mode)
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT pl_name, sy_dist_ly, pl_dens, pl_insol_wm2
+        FROM exoplanets ORDER BY pl_name
+    """).fetchall()
+    triggers = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    conn.close()
+
+    assert rows == [
+        ("A b", pytest.approx(213.9 * 3.26156),
+         pytest.approx(5.514 * 88.9 / 14.2 ** 3, abs=1e-3), None),
+        ("B c", None, None, pytest.approx(1.5 * 1361)),
+    ]
+    # Only the search index is kept by triggers
+    assert all(name.startswith("exoplanets_fts_") for name, in triggers)
+
+
+def test_merge_counts_are_zero_for_unchanged_csv(tmp_path):
+    csv_path, db_path = make_database(tmp_path)
+    load_data(csv_path, db_path)
+
+    counts = load_data(csv_path, db_path)
+
+    assert counts == {"rows": 3, "inserted": 0, "updated": 0, "deleted": 0}
+
+
+def test_refresh_database_swaps_in_new_file(tmp_path):
+    csv_path, db_path = make_database(tmp_path)
+    load_data(csv_path, db_path)
+    reader = sqlite3.connect(db_path)
+    csv_path.write_text(CSV.replace("A b,2011", "A b,1999"), encoding="utf-8")
+
+    refresh_database(csv_path, db_path)
+
+    query = "SELECT disc_year FROM exoplanets WHERE pl_name = 'A b'"
+    assert reader.execute(query).fetchone() == (2011,)
+    reader.close()
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(query).fetchone() == (1999,)
+    conn.close()
+    assert not (tmp_path / "exoplanets.db.new").exists()
+
+
+def test_failed_refresh_keeps_live_database(tmp_path):
+    csv_path, db_path = make_database(tmp_path)
+    load_data(csv_path, db_path)
+    before = db_path.read_bytes()
+    csv_path.write_text(CSV.splitlines(keepends=True)[0], encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        refresh_database(csv_path, db_path)
+
+    assert db_path.read_bytes() == before
+    assert not (tmp_path / "exoplanets.db.new").exists()
@@ -0,0 +1,141 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from create_db import migrate
+from repository import ALLOWED_ORDER
+from repository import DISPLAY_COLUMNS
+from repository import ConnectionPool
+from repository import PagedQuery
+from repository import connect
+from repository import filter_clause
+
+
+@pytest.mark.parametrize("order_key", sorted(ALLOWED_ORDER))
+def test_paged_query_walks_pages_in_sort_order(conn, order_key,
+                                               expected_rows):
+    view = PagedQuery(conn, order_key, page_size=50)
+
+    rows = []
+    for start in range(0, view.count, 30):
+        rows.extend(view.rows(start, start + 30))
+
+    assert rows == expected_rows(conn, ALLOWED_ORDER[order_key])
+
+
+def test_paged_query_jumps_to_unread_pages(conn, expected_rows):
+    view = PagedQuery(conn, "distance", page_size=50)
+    expected = expected_rows(conn, "sy_dist")
+
+    assert view.rows(420, 460) == expected[420:460]
+    assert view.rows(460, 537) == expected[460:]
+    assert view.rows(0, 10) == expected[:10]
+
+
+def filtered_walk(conn, order_key, text, descending=False):
+    where, params = filter_clause(text)
+    view = PagedQuery(conn, order_key, page_size=20, descending=descending,
+                      where=where, params=params)
+    rows = []
+    for start in range(0, view.count, 15):
+        rows.extend(view.rows(start, start + 15))
+    assert len(rows) == view.count
+    return rows
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("order_key", ["name", "size", "publication_date"])
+def test_paged_query_filters_and_sorts_in_one_query(conn, order_key,
+                                                     descending,
+                                                     expected_rows):
+    column = ALLOWED_ORDER[order_key]
+    expected = expected_rows(conn, column, """
+        pl_name LIKE 'Planet 0%' AND pl_rade BETWEEN 1.5 AND 3.25
+        AND disc_pubdate >= '2015'
+    """)
+    if descending:
+        present = [row for row in expected
+                   if row[DISPLAY_COLUMNS.index(column)] is not None]
+        expected = present[::-1] + expected[len(present):]
+
+    rows = filtered_walk(conn, order_key,
+                         '"planet 0*" size:1.5..3.25 publication_date:2015..',
+                         descending)
+
+    assert expected and rows == expected
+
+
+@pytest.mark.parametrize("text, where", [
+    ("velocity", "discoverymethod = 'Radial Velocity'"),
+    ("nsi distance:2", "discoverymethod = 'Transit' AND sy_dist = 2"),
+    ("v 03", "pl_name LIKE '%03%' AND discoverymethod = 'Radial Velocity'"),
+    ("distance_ly:..7 habitable_zone:0", "sy_dist <= 2 AND pl_hz = 0"),
+])
+def test_filter_matches_names_and_discovery_methods(conn, text, where,
+                                                    expected_rows):
+    assert filtered_walk(conn, "distance", text) == \
+        expected_rows(conn, "sy_dist", where)
+
+
+@pytest.mark.parametrize("text, names", [
+    ("Kepler_*", ["Kepler_1 b"]),
+    ("100%*", ["100% c"]),
+    ("Kepler?1*", ["Kepler-1 b", "KeplerX1 b", "Kepler_1 b"]),
+])
+def test_wildcard_filter_matches_special_characters_literally(conn, text,
+                                                              names):
+    conn.executemany("INSERT INTO exoplanets (pl_name) VALUES (?)",
+                     [("Kepler_1 b",), ("Kepler-1 b",), ("KeplerX1 b",),
+                      ("100% c",), ("1000 c",)])
+
+    assert [row[0] for row in filtered_walk(conn, "name", text)] == names
+
+
+@pytest.mark.parametrize("text", ["mass:heavy", "radius:1..2", '"Kepler'])
+def test_filter_clause_rejects_malformed_text(text):
+    with pytest.raises(ValueError):
+        filter_clause(text)
+
+
+def test_empty_filter_has_no_clause():
+    assert filter_clause("  ") == ("", [])
+
+
+def test_readonly_connection_is_tuned_and_cannot_write(tmp_path):
+    db_path = tmp_path / "exoplanets.db"
+    writer = connect(db_path)
+    migrate(writer)
+    writer.close()
+
+    conn = connect(db_path, readonly=True)
+    assert conn.execute("PRAGMA temp_store").fetchone() == (2,)
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] < 0
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conn.execute("DELETE FROM exoplanets")
+    conn.close()
+
+    with pytest.raises(sqlite3.OperationalError):
+        connect(tmp_path / "missing.db", readonly=True)
+
+
+def test_connection_pool_shares_connections_between_threads(tmp_path):
+    db_path = tmp_path / "exoplanets.db"
+    writer = connect(db_path)
+    migrate(writer)
+    writer.close()
+
+    pool = ConnectionPool(db_path, size=2)
+    used = []
+
+    def count():
+        with pool.connection() as conn:
+            used.append(id(conn))
+            return conn.execute("SELECT count(*) FROM exoplanets").fetchone()
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda _: count(), range(30)))
+    pool.close()
+
+    assert results == [(0,)] * 30
+    assert len(set(used)) <= 2
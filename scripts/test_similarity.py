@@ -0,0 +1,105 @@
+import math
+import random
+
+import pytest
+
+from create_db import migrate
+from repository import connect
+from similarity import FEATURES
+from similarity import KDTree
+from similarity import SimilarityIndex
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    rng = random.Random(3)
+    path = tmp_path / "exoplanets.db"
+    conn = connect(path)
+    migrate(conn)
+
+    def value(low, high):
+        # About a third of the values are missing, like in the archive
+        return None if rng.random() < 0.3 else 10 ** rng.uniform(low, high)
+
+    conn.executemany(
+        f"INSERT INTO exoplanets (pl_name, {', '.join(FEATURES)}) "
+        f"VALUES (?, ?, ?, ?, ?)",
+        [(f"Planet {i:04d}", value(-1, 3), value(-0.5, 1.3), value(-0.5, 4),
+          value(-2, 4)) for i in range(800)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def brute_force(index, name, features=None):
+    point = index.coordinates[index.positions[name]]
+    compared = [feature for feature in (features or FEATURES)
+                if feature in point]
+    distances = []
+    for other, coordinates in zip(index.names, index.coordinates):
+        if other != name and all(f in coordinates for f in compared):
+            squared = sum((coordinates[f] - point[f]) ** 2 for f in compared)
+            distances.append(math.sqrt(squared / len(compared)))
+    return sorted(distances)
+
+
+def test_kd_tree_matches_brute_force():
+    rng = random.Random(5)
+    points = [(rng.random(), rng.random(), rng.random()) for _ in range(500)]
+    tree = KDTree(points)
+
+    for _ in range(20):
+        target = (rng.random(), rng.random(), rng.random())
+        squared = sorted(sum((a - b) ** 2 for a, b in zip(point, target))
+                         for point in points)
+        assert [d for d, _ in tree.nearest(target, 7)] == squared[:7]
+        assert [d for d, _ in tree.within(target, 0.02)] == \
+            [d for d in squared if d <= 0.02]
+
+    assert tree.nearest((0.5, 0.5, 0.5), 0) == []
+    assert tree.nearest((0.5, 0.5, 0.5), -1) == []
+
+
+def test_nearest_compares_the_features_a_planet_has(db_path, tmp_path):
+    index = SimilarityIndex.open(db_path, tmp_path / "similarity.pickle")
+
+    with pytest.raises(ValueError, match="not in the similarity index"):
+        index.nearest("Nowhere b")
+    with pytest.raises(ValueError, match="positive"):
+        index.nearest(index.names[0], k=0)
+
+    for name in index.names[::40]:
+        point = index.coordinates[index.positions[name]]
+        if not point:
+            with pytest.raises(ValueError):
+                index.nearest(name)
+            continue
+        found = index.nearest(name, k=5)
+        assert name not in [other for other, _ in found]
+        assert [d for _, d in found] == \
+            pytest.approx(brute_force(index, name)[:5])
+
+        if "pl_masse" in point or "pl_rade" in point:
+            within = index.within(name, 0.3, features=["pl_masse", "pl_rade"])
+            expected = brute_force(index, name, ["pl_masse", "pl_rade"])
+            assert [d for _, d in within] == \
+                pytest.approx([d for d in expected if d <= 0.3])
+
+
+def test_saved_index_is_reused_until_the_database_changes(db_path, tmp_path):
+    index_path = tmp_path / "similarity.pickle"
+    built = SimilarityIndex.open(db_path, index_path)
+    saved = index_path.stat().st_mtime_ns
+
+    loaded = SimilarityIndex.open(db_path, index_path)
+    assert loaded.names == built.names
+    assert index_path.stat().st_mtime_ns == saved
+
+    conn = connect(db_path)
+    conn.execute("DELETE FROM exoplanets WHERE pl_name = 'Planet 0000'")
+    conn.commit()
+    conn.close()
+
+    rebuilt = SimilarityIndex.open(db_path, index_path)
+    assert "Planet 0000" not in rebuilt.names
@@ -0,0 +1,246 @@
+import csv
+import gzip
+import hashlib
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from create_db import schema_columns
+from update_data import build_query
+from update_data import read_sync_state
+from update_data import sync_csv
+from update_data import update_csv
+
+
+HEADER = "pl_name,disc_year,sy_dist\n"
+BODY = (HEADER + "".join(
+    f"Planet-{i} b,{2000 + i % 25},{i * 0.37:.2f}\n" for i in range(20_000)
+)).encode("utf-8")
+
+
+class ArchiveStub(BaseHTTPRequestHandler):
+    """Serves BODY with gzip and Range support, optionally failing once."""
+
+    protocol_version = "HTTP/1.1"
+    body = BODY
+    drop_first = False
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append(dict(self.headers))
+        range_header = self.headers.get("Range")
+
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            payload = self.body[start:]
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                f"bytes {start}-{len(self.body) - 1}/{len(self.body)}")
+        else:
+            payload = self.body
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = gzip.compress(payload)
+                self.send_header("Content-Encoding", "gzip")
+
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+
+        if type(self).drop_first:
+            type(self).drop_first = False
+            self.wfile.write(payload[:len(payload) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def archive():
+    ArchiveStub.body = BODY
+    ArchiveStub.drop_first = False
+    ArchiveStub.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/TAP/sync"
+    server.shutdown()
+    server.server_close()
+
+
+def test_update_csv_streams_gzip_download(archive, tmp_path):
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    events = []
+
+    update_csv(archive, csv_path,
+               progress=lambda phase, **counts: events.append(counts))
+
+    assert csv_path.read_bytes() == BODY
+    assert "gzip" in ArchiveStub.requests_seen[0]["Accept-Encoding"]
+    assert events[-1]["bytes"] == events[-1]["total"] < len(BODY)
+    assert not (tmp_path / "nasa_exoplanets.csv.part").exists()
+
+
+def test_update_csv_resumes_interrupted_download(archive, tmp_path):
+    ArchiveStub.drop_first = True
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+
+    update_csv(archive, csv_path)
+
+    assert csv_path.read_bytes() == BODY
+    resumed = ArchiveStub.requests_seen[1]
+    assert resumed["Range"].startswith("bytes=")
+    assert resumed["If-Range"] == '"v1"'
+
+
+def test_failed_download_keeps_previous_csv(archive, tmp_path):
+    ArchiveStub.body = b"<VOTABLE>ERROR</VOTABLE>\n"
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    csv_path.write_bytes(BODY)
+
+    with pytest.raises(ValueError):
+        update_csv(archive, csv_path)
+
+    assert csv_path.read_bytes() == BODY
+
+
+def test_update_csv_gives_up_after_retries(tmp_path):
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        update_csv("http://127.0.0.1:9/", csv_path, retries=1)
+
+    assert not csv_path.exists()
+
+
+class TapStub(BaseHTTPRequestHandler):
+    """Answers ``select * from ps [where rowupdate >= 'date']`` queries."""
+
+    protocol_version = "HTTP/1.1"
+    rows = []
+    queries = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)["query"][0]
+        type(self).queries.append(query)
+
+        rows = self.rows
+        if "rowupdate >= " in query:
+            mark = query.rsplit("'", 2)[1]
+            rows = [row for row in rows if row[3] >= mark]
+        body = "pl_name,pl_refname,pl_masse,rowupdate\n" + "".join(
+            ",".join(row) + "\n" for row in rows)
+        body = body.encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tap():
+    TapStub.rows = [
+        ["Earth b", "ref1", "1.0", "2020-01-01"],
+        ["Earth b", "ref2", "1.1", "2020-01-01"],
+        ["Mars c", "ref1", "0.1", "2021-06-01"],
+    ]
+    TapStub.queries = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TapStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/TAP/sync"
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_csv_merges_rows_updated_since_last_sync(tap, tmp_path):
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    sync_path = tmp_path / "sync_state.json"
+
+    state = sync_csv("select * from ps", tap, csv_path, sync_path)
+    assert state["rowupdate"] == "2021-06-01"
+    assert TapStub.queries == ["select * from ps"]
+
+    TapStub.rows[1] = ["Earth b", "ref2", "1.2", "2022-02-02"]
+    TapStub.rows.append(["Venus d", "ref3", "0.8", "2022-02-02"])
+    state = sync_csv("select * from ps", tap, csv_path, sync_path)
+
+    assert TapStub.queries[-1] == \
+        "select * from ps where rowupdate >= '2021-06-01'"
+    assert state["rowupdate"] == "2022-02-02"
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = [list(row.values()) for row in csv.DictReader(f)]
+    assert rows == TapStub.rows
+
+
+def test_sync_csv_skips_unchanged_archive(tap, tmp_path):
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    sync_path = tmp_path / "sync_state.json"
+    sync_csv("select * from ps", tap, csv_path, sync_path)
+    sync_csv("select * from ps", tap, csv_path, sync_path)
+    before = csv_path.stat().st_mtime_ns
+
+    state = sync_csv("select * from ps", tap, csv_path, sync_path)
+
+    assert csv_path.stat().st_mtime_ns == before
+    assert state == read_sync_state(sync_path)
+    assert not (tmp_path / "nasa_exoplanets.csv.delta").exists()
+
+
+def test_sync_csv_downloads_again_when_csv_is_missing(tap, tmp_path):
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    sync_path = tmp_path / "sync_state.json"
+    # No rowupdate mark, so the next sync asks for the same URL and
+    # could be answered 304 for the saved ETag
+    TapStub.rows = [row[:3] + [""] for row in TapStub.rows]
+    state = sync_csv("select * from ps", tap, csv_path, sync_path)
+    assert state["etag"]
+    csv_path.unlink()
+
+    sync_csv("select * from ps", tap, csv_path, sync_path)
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        assert len(list(csv.DictReader(f))) == 3
+
+
+def test_build_query_projects_schema_columns_on_server():
+    query = build_query()
+
+    columns = query.split(" from ")[0].removeprefix("select ").split(",")
+    assert columns == schema_columns() + ["rowupdate"]
+    assert query.endswith(" from ps where default_flag = 1")
+    assert build_query("pscomppars", ["*"]) == "select * from pscomppars"
+
+
+def test_sync_csv_adds_delta_condition_to_projected_query(tap, tmp_path):
+    query = "select pl_name,pl_refname,pl_masse,rowupdate from ps " \
+        "where default_flag = 1"
+    csv_path = tmp_path / "nasa_exoplanets.csv"
+    sync_path = tmp_path / "sync_state.json"
+    sync_csv(query, tap, csv_path, sync_path)
+
+    sync_csv(query, tap, csv_path, sync_path)
+
+    assert TapStub.queries[-1] == \
+        query + " and rowupdate >= '2021-06-01'"
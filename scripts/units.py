@@ -0,0 +1,95 @@
+"""
+Physical constants and derived quantities shared by the v1 reports and
+the database.
+
+The database stores the quantities of `DERIVED_COLUMNS` in columns of
+their own, computed by SQLite in the statement writing each row (see
+`create_db.derived_select`), so sorting and filtering on them does no
+math. `in_habitable_zone` computes the habitable zone flag for code
+working outside the database.
+"""
+EARTH_RADIUS_KM = 6371
+EARTH_FLUX_W_M2 = 1361
+EARTH_MASS_KG = 5.972e24
+SOLAR_MASS_KG = 1.9885e30
+PARSEC_M = 3.085677581e16
+AU_PER_PARSEC = 206265
+LIGHTYEARS_PER_PARSEC = 3.26156
+EARTH_YEAR = 365.25
+EARTH_DENSITY_G_CM3 = 5.514
+EARTH_GRAVITY_M_S2 = 9.80665
+
+# Habitable zone limits of Kopparapu et al. (2014), as effective stellar
+# flux S_eff = S_eff_sun + a*T + b*T^2 + c*T^3 + d*T^4 with
+# T = T_eff - 5780 K: (S_eff_sun, a, b, c, d). The conservative zone
+# lies between the runaway and the maximum greenhouse limits.
+RUNAWAY_GREENHOUSE = (1.107, 1.332e-4, 1.58e-8, -8.308e-12, -1.931e-15)
+MAXIMUM_GREENHOUSE = (0.356, 6.171e-5, 1.698e-9, -3.198e-12, -5.575e-16)
+# Stellar temperatures the fit holds for, in K
+HZ_TEFF_RANGE = (2600, 7200)
+
+
+def habitable_zone_flux(teff):
+    """
+    Returns the (inner, outer) flux limits of the habitable zone in S⊕.
+
+    Returns None when `teff` is missing or outside `HZ_TEFF_RANGE`.
+    """
+    if teff is None or not HZ_TEFF_RANGE[0] <= teff <= HZ_TEFF_RANGE[1]:
+        return None
+    t = teff - 5780
+    return tuple(s + t * (a + t * (b + t * (c + t * d)))
+                 for s, a, b, c, d in (RUNAWAY_GREENHOUSE, MAXIMUM_GREENHOUSE))
+
+
+def in_habitable_zone(insolation, teff):
+    """
+    Tells whether a planet receives a flux inside the habitable zone.
+
+    Returns None when either value is missing or the star is outside
+    `HZ_TEFF_RANGE`.
+    """
+    limits = habitable_zone_flux(teff)
+    if insolation is None or limits is None:
+        return None
+    inner, outer = limits
+    return outer <= insolation <= inner
+
+
+def _flux_sql(coefficients):
+    s, a, b, c, d = coefficients
+    t = "(st_teff - 5780)"
+    return f"({s!r} + {t} * ({a!r} + {t} * ({b!r} + {t} * ({c!r} + {t} * {d!r}))))"
+
+
+# Archive columns the derived quantities are computed from
+DERIVED_FROM = ["sy_dist", "pl_rade", "pl_masse", "pl_insol", "pl_orbper",
+                "st_mass", "st_teff"]
+
+# Column -> (SQL type, SQL expression over `DERIVED_FROM`). Missing
+# inputs give NULL, as SQL arithmetic on NULL does.
+DERIVED_COLUMNS = {
+    "sy_dist_ly": ("REAL", f"sy_dist * {LIGHTYEARS_PER_PARSEC!r}"),
+    "sy_dist_au": ("REAL", f"sy_dist * {AU_PER_PARSEC!r}"),
+    "sy_dist_km": ("REAL", f"sy_dist * {PARSEC_M / 1000!r}"),
+    "pl_rade_km": ("REAL", f"pl_rade * {EARTH_RADIUS_KM!r}"),
+    "pl_masse_kg": ("REAL", f"pl_masse * {EARTH_MASS_KG!r}"),
+    "pl_insol_wm2": ("REAL", f"pl_insol * {EARTH_FLUX_W_M2!r}"),
+    "pl_orbper_years": ("REAL", f"pl_orbper / {EARTH_YEAR!r}"),
+    "st_mass_kg": ("REAL", f"st_mass * {SOLAR_MASS_KG!r}"),
+    # Bulk density (g/cm³) and surface gravity (m/s²) from the mass and
+    # radius in Earth units
+    "pl_dens": ("REAL", f"round({EARTH_DENSITY_G_CM3!r} * pl_masse"
+                        f" / (pl_rade * pl_rade * pl_rade), 3)"),
+    "pl_grav": ("REAL", f"round({EARTH_GRAVITY_M_S2!r} * pl_masse"
+                        f" / (pl_rade * pl_rade), 3)"),
+    # 1 inside the conservative habitable zone, 0 outside, NULL unknown
+    "pl_hz": ("INTEGER", f"""CASE
+        WHEN pl_insol IS NULL OR st_teff IS NULL
+            OR st_teff < {HZ_TEFF_RANGE[0]} OR st_teff > {HZ_TEFF_RANGE[1]}
+            THEN NULL
+        WHEN pl_insol <= {_flux_sql(RUNAWAY_GREENHOUSE)}
+            AND pl_insol >= {_flux_sql(MAXIMUM_GREENHOUSE)} THEN 1
+        ELSE 0
+    END"""),
+}
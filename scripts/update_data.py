@@ -1,28 +1,357 @@
+import argparse
+import csv
+import json
+import os
 import requests
 from pathlib import Path
+from urllib.parse import urlencode
+
+import instrument
+from create_db import schema_columns
+from progress import report_progress
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 
 CSV_PATH = DATA_DIR / "nasa_exoplanets.csv"
+SYNC_PATH = DATA_DIR / "sync_state.json"
+
+TAP_URL = "https://exoplanetarchive.ipac.caltech.edu/TAP/sync"
+
+
+def build_query(table="ps", columns=None, default_only=True):
+    """
+    Builds the TAP query for the archive table.
+
+    By default only the columns of the local ``exoplanets`` schema are
+    requested (plus ``rowupdate``, used by incremental syncs), and only
+    the default parameter set of each planet, so both the projection and
+    the deduplication happen on the server.
+
+    Parameters
+    ----------
+    table : str
+        ``"ps"`` (one row per planet and reference) or ``"pscomppars"``
+        (one composite row per planet).
+    columns : list of str, optional
+        Columns to select. ``["*"]`` selects every column.
+    default_only : bool
+        Keep only rows with ``default_flag = 1`` (``ps`` table only).
+    """
+    if columns is None:
+        columns = schema_columns() + ["rowupdate"]
+        if table == "ps" and not default_only:
+            columns.append("pl_refname")
+
+    query = f"select {','.join(columns)} from {table}"
+    if table == "ps" and default_only:
+        query = add_condition(query, "default_flag = 1")
+    return query
+
+
+def add_condition(query, condition):
+    joiner = " and " if " where " in query else " where "
+    return query + joiner + condition
+
+
+def tap_url(query, base=TAP_URL):
+    return f"{base}?{urlencode({'query': query, 'format': 'csv'})}"
+
+
+QUERY = build_query()
+URL = tap_url(QUERY)
+
+CHUNK_SIZE = 64 * 1024
+RETRIES = 3
 
-URL = (
-    "https://exoplanetarchive.ipac.caltech.edu/TAP/sync"
-    "?query=select+*+from+ps&format=csv"
+# Errors after which the transfer is resumed instead of abandoned
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
 )
 
 
-def update_csv():
+@instrument.traced()
+def update_csv(url=URL, csv_path=CSV_PATH, retries=RETRIES, headers=None,
+               progress=None):
+    """
+    Downloads the archive CSV and atomically replaces the local copy.
+
+    The response is streamed in chunks to a temporary ``.part`` file, so
+    memory use does not depend on the size of the archive. If the
+    connection drops, the download resumes where it stopped using an
+    HTTP Range request. Only a complete file is renamed over `csv_path`;
+    a failed download leaves the previous CSV untouched.
+
+    `headers` are sent with the first request only, e.g. conditional
+    ``If-None-Match`` / ``If-Modified-Since`` headers. `progress`, if
+    given, is called as in `report_progress` after every chunk.
+
+    Returns the ETag and Last-Modified headers of the response, or None
+    when the server answered 304 Not Modified.
+    """
     print("Downloading latest exoplanet data...")
 
-    response = requests.get(URL, timeout=60)
-    response.raise_for_status()
+    csv_path.parent.mkdir(exist_ok=True)
+    part_path = csv_path.with_name(csv_path.name + ".part")
+    part_path.unlink(missing_ok=True)
+
+    validators = {}
+    for attempt in range(retries + 1):
+        try:
+            if not download(url, part_path, validators, headers,
+                            progress=progress):
+                print("CSV is already up to date.")
+                return None
+            break
+        except TRANSIENT_ERRORS as error:
+            if attempt == retries:
+                raise
+            print(f"Download interrupted ({error}), resuming...")
 
-    DATA_DIR.mkdir(exist_ok=True)
-    CSV_PATH.write_text(response.text, encoding="utf-8")
+    check_csv(part_path)
+    os.replace(part_path, csv_path)
 
     print("CSV updated successfully.")
+    return validators
+
+
+def download(url, part_path, validators, headers=None,
+             chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Streams `url` into `part_path`, continuing a partial file if present.
+
+    A fresh transfer asks for gzip transfer encoding. Byte ranges refer
+    to the uncompressed body, so a resumed transfer asks for the identity
+    encoding and sends ``If-Range`` with the validator of the first
+    response: if the remote file changed meanwhile, the server answers
+    with the full body and the partial file is overwritten.
+
+    `validators` is a dict shared between attempts; the ETag and
+    Last-Modified values of the first response are stored in it.
+
+    Returns False if the server answered 304 Not Modified, else True.
+    """
+    offset = part_path.stat().st_size if part_path.exists() else 0
+
+    request_headers = {"Accept-Encoding": "gzip", **(headers or {})}
+    if offset:
+        request_headers = {"Accept-Encoding": "identity",
+                           "Range": f"bytes={offset}-"}
+        validator = validators.get("ETag") or validators.get("Last-Modified")
+        if validator:
+            request_headers["If-Range"] = validator
+
+    with requests.get(url, headers=request_headers, stream=True,
+                      timeout=60) as response:
+        if response.status_code == 304:
+            return False
+        if response.status_code == 416 and \
+                response.headers.get("Content-Range") == f"bytes */{offset}":
+            return True
+
+        response.raise_for_status()
+        if response.status_code == 200:
+            validators.clear()
+            for name in ("ETag", "Last-Modified"):
+                if name in response.headers:
+                    validators[name] = response.headers[name]
+
+        mode = "ab" if response.status_code == 206 else "wb"
+        if mode == "wb":
+            offset = 0
+        length = response.headers.get("Content-Length")
+        total = offset + int(length) if length else None
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+                if progress:
+                    # Bytes on the wire, which may be gzip-compressed
+                    progress("download", bytes=offset + response.raw.tell(),
+                             total=total)
+
+    return True
+
+
+def check_csv(path):
+    """
+    Rejects a download that does not look like an exoplanet CSV.
+    """
+    with open(path, encoding="utf-8") as f:
+        header = f.readline()
+    if "pl_name" not in header.strip().split(","):
+        raise ValueError(f"{path.name} is not an exoplanet CSV")
+
+
+@instrument.traced()
+def sync_csv(query=QUERY, base=TAP_URL, csv_path=CSV_PATH,
+             sync_path=SYNC_PATH, full=False, progress=None):
+    """
+    Brings the local CSV up to date, transferring as little as possible.
+
+    The first sync (or one with ``full=True``) downloads the whole query
+    result. Afterwards only rows whose ``rowupdate`` is on or after the
+    stored high-water mark are requested and merged into the CSV. Every
+    request is conditional on the ETag / Last-Modified values of the
+    previous one, so an unchanged archive answers 304 and nothing is
+    transferred. Rows deleted from the archive only disappear on a full
+    sync.
+
+    The sync state is kept in `sync_path` next to the CSV.
+    """
+    state = read_sync_state(sync_path)
+    if state.get("query") != query or not csv_path.exists():
+        full = True
+
+    mark = state.get("rowupdate")
+    delta = not full and mark is not None
+    if delta:
+        url = tap_url(add_condition(query, f"rowupdate >= '{mark}'"), base)
+    else:
+        url = tap_url(query, base)
+
+    # A forced or first download must not be answered with 304, which
+    # would leave no CSV behind
+    headers = {}
+    if not full:
+        if state.get("url") == url and state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    target = csv_path.with_name(csv_path.name + ".delta") if delta \
+        else csv_path
+    validators = update_csv(url, target, headers=headers, progress=progress)
+    if validators is None:
+        return state
+
+    if delta:
+        if progress:
+            progress("merge")
+        try:
+            added, updated = merge_csv(csv_path, target)
+        finally:
+            target.unlink(missing_ok=True)
+        print(f"Merged {added} new and {updated} updated rows.")
+
+    state = {
+        "query": query,
+        "url": url,
+        "etag": validators.get("ETag"),
+        "last_modified": validators.get("Last-Modified"),
+        "rowupdate": max_rowupdate(csv_path),
+    }
+    write_sync_state(sync_path, state)
+    return state
+
+
+def read_sync_state(sync_path=SYNC_PATH):
+    try:
+        with open(sync_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_sync_state(sync_path, state):
+    tmp_path = sync_path.with_name(sync_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, sync_path)
+
+
+def row_key(row):
+    """
+    Identifies a row of the archive: a planet and its parameter set.
+    """
+    return row["pl_name"], row.get("pl_refname")
+
+
+@instrument.traced()
+def merge_csv(csv_path, delta_path):
+    """
+    Replaces or appends the rows of `delta_path` into `csv_path`.
+
+    Only the delta is held in memory; the existing CSV is streamed into
+    a temporary file that is atomically renamed over it.
+
+    Returns
+    -------
+    tuple of int
+        Number of added and updated rows.
+    """
+    with open(delta_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        delta_fields = reader.fieldnames
+        changes = {row_key(row): row for row in reader}
+    if not changes:
+        return 0, 0
+
+    merged_path = csv_path.with_name(csv_path.name + ".merge")
+    updated = 0
+    with open(csv_path, newline="", encoding="utf-8") as src, \
+            open(merged_path, "w", newline="", encoding="utf-8") as dst:
+        reader = csv.DictReader(src)
+        if reader.fieldnames != delta_fields:
+            raise ValueError("Archive columns changed; run a full sync.")
+
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames,
+                                lineterminator="\n")
+        writer.writeheader()
+        for row in reader:
+            change = changes.pop(row_key(row), None)
+            if change is not None and change != row:
+                updated += 1
+            writer.writerow(change or row)
+        writer.writerows(changes.values())
+
+    if updated or changes:
+        os.replace(merged_path, csv_path)
+    else:
+        merged_path.unlink()
+    return len(changes), updated
+
+
+def max_rowupdate(csv_path):
+    """
+    Returns the latest ``rowupdate`` value in the CSV, or None.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        if "rowupdate" not in (reader.fieldnames or []):
+            return None
+        return max((row["rowupdate"] for row in reader if row["rowupdate"]),
+                   default=None)
 
 
 if __name__ == "__main__":
-    update_csv()
+    parser = argparse.ArgumentParser(
+        description="Download the latest NASA exoplanet data.")
+    parser.add_argument("--full", action="store_true",
+                        help="download the whole table instead of a delta")
+    parser.add_argument("--table", choices=("ps", "pscomppars"),
+                        default="ps",
+                        help="archive table to download (default: ps)")
+    parser.add_argument("--all-parameter-sets", action="store_true",
+                        help="keep every parameter set, not only the "
+                             "default one (ps only)")
+    parser.add_argument("--all-columns", action="store_true",
+                        help="download every column, not only the ones "
+                             "stored in the database")
+    parser.add_argument("--progress", action="store_true",
+                        help="print machine-readable progress events")
+    parser.add_argument("--profile", nargs="?", const="1", metavar="DIR",
+                        help="write a per-stage time and memory trace to "
+                             "DIR (default: data/profile)")
+    args = parser.parse_args()
+
+    query = build_query(
+        args.table,
+        columns=["*"] if args.all_columns else None,
+        default_only=not args.all_parameter_sets,
+    )
+    with instrument.session("update_data", args.profile):
+        sync_csv(query, full=args.full,
+                 progress=report_progress if args.progress else None)
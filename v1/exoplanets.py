@@ -7,27 +7,77 @@ astronomical and physical unit conversions.
 """
 
 import requests
+import argparse
+import ast
 import csv
+import functools
+import hashlib
+import heapq
 import json
-
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+
+from array import array
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, wait,
+)
 from pathlib import Path
 
-EARTH_RADIUS_KM = 6371
-EARTH_FLUX_W_M2 = 1361
-EARTH_MASS_KG = 5.972e24
-SOLAR_MASS_KG = 1.9885e30
-PARSEC_M = 3.085677581e16
-AU_PER_PARSEC = 206265
-LIGHTYEARS_PER_PARSEC = 3.26156
-EARTH_YEAR = 365.25
+# The instrumentation layer and the units are shared with the scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import instrument  # noqa: E402
+import units  # noqa: E402
+# The conversion constants are shared with the database's derived columns
+from units import (  # noqa: E402
+    AU_PER_PARSEC, EARTH_FLUX_W_M2, EARTH_MASS_KG, EARTH_RADIUS_KM,
+    EARTH_YEAR, LIGHTYEARS_PER_PARSEC, PARSEC_M, SOLAR_MASS_KG,
+)
+
 MISSING_VALUE = float("inf")
+NAN = float("nan")
+
+KEY_FIELDNAMES = [
+    "pl_name",
+    "disc_year",
+    "disc_pubdate",
+    "sy_dist",
+    "discoverymethod",
+    "pl_orbper",
+    "pl_orbsmax",
+    "pl_rade",
+    "pl_masse",
+    "pl_eqt",
+    "pl_insol",
+    "st_teff",
+    "st_mass",
+    "st_rad",
+]
+NUMERIC_FIELDS = {
+    "disc_year",
+    "sy_dist",
+    "pl_orbper",
+    "pl_orbsmax",
+    "pl_rade",
+    "pl_masse",
+    "pl_eqt",
+    "pl_insol",
+    "st_teff",
+    "st_mass",
+    "st_rad",
+}
 
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 
 
 # Use the NASA API to get information about exoplanets
-def main():
+def main(argv=None):
     """
     Executes the full exoplanet data analysis pipeline.
 
@@ -36,6 +86,7 @@ def main():
     - Stores the raw data in CSV and JSON formats.
     - Removes duplicate entries.
     - Extracts scientifically relevant fields.
+      (These three steps share a single streaming pass over the raw CSV.)
     - Generates sorted datasets and human-readable reports related to:
         * Distance
         * Discovery year and publication date
@@ -44,48 +95,153 @@ def main():
         * Stellar mass
         * Incident stellar flux (insolation)
 
-    All outputs are written to the `data/` directory.
-    """
-    response = fetch_nasa_data()
-    get_nasa_data(response)
-    nasa_data_json()
-    all_data_csv()
-    all_data_json()
-    clean_csv_data()
-    key_data_json()
-    exoplanets_distance()
-    discovery_year()
-    publication_date()
-    size_exoplanets()
-    orbital_period()
-    exoplanets_mass()
-    stars_mass()
-    insolation()
+    The steps are declared as a graph of stages (see `pipeline_stages`)
+    and independent ones run concurrently. All outputs are written to
+    the `data/` directory. Stages whose inputs and code are unchanged
+    since the last run are skipped (see `BuildCache`).
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command-line arguments; see `parse_args`.
+    """
+    args = parse_args(argv)
+
+    with instrument.session("exoplanets", args.profile,
+                            args.cprofile or None):
+        cache = BuildCache(rebuild=args.rebuild)
+        run_pipeline(pipeline_stages(args.json_format, args.top, args.window),
+                     jobs=args.jobs, cache=cache)
+
+
+def parse_args(argv=None):
+    """
+    Parses the command-line options of the pipeline.
 
+    Parameters
+    ----------
+    argv : list of str, optional
+        Arguments to parse. Defaults to ``sys.argv[1:]``.
 
+    Returns
+    -------
+    argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="processes running independent stages at once "
+             "(default: the CPU count; 1 runs them serially)")
+    parser.add_argument(
+        "--top", type=_positive_int, metavar="N",
+        help="list only the first N planets with data in each report")
+    parser.add_argument(
+        "--window", type=_percentile_window, metavar="LOW:HIGH",
+        help="list only the planets with data between two percentiles "
+             "in each report, e.g. 90:100 for the top decile")
+    parser.add_argument(
+        "--rebuild", action="store_true",
+        help="regenerate every output, even if its inputs are unchanged")
+    parser.add_argument(
+        "--json-format", choices=JSON_FORMATS, default="pretty",
+        help="layout of the JSON outputs: indented (default), compact, "
+             "or one object per line in .ndjson files")
+    parser.add_argument(
+        "--profile", nargs="?", const="1", metavar="DIR",
+        help="record the time and memory of every stage in a JSON trace "
+             "in DIR (default: data/profile); the EXOPLANETS_PROFILE "
+             "environment variable does the same")
+    parser.add_argument(
+        "--cprofile", action="store_true",
+        help="with --profile, also dump a cProfile file per stage")
+    return parser.parse_args(argv)
+
+
+def _positive_int(text):
+    """
+    Parses a count of at least one for `parse_args`.
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected a positive integer, got {text!r}") from None
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected a positive integer, got {value}")
+    return value
+
+
+def _percentile_window(text):
+    """
+    Parses a ``LOW:HIGH`` percentile window for `parse_args`.
+    """
+    try:
+        low, high = (float(part) for part in text.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected LOW:HIGH percentiles, got {text!r}") from None
+    if not 0 <= low < high <= 100:
+        raise argparse.ArgumentTypeError(
+            "percentiles must satisfy 0 <= LOW < HIGH <= 100")
+    return low, high
+
+
+@instrument.traced()
 def fetch_nasa_data():
     """
     Fetches raw exoplanet data from the NASA Exoplanet Archive API.
 
     The data is retrieved using a TAP query and returned in CSV format.
+    When a raw CSV from a previous run exists, the request is made
+    conditional on its ETag / Last-Modified values, so an unchanged
+    archive answers 304 Not Modified without transferring the table.
 
     Returns
     -------
     requests.Response
-        HTTP response object containing the CSV data.
+        HTTP response object containing the CSV data, or an empty
+        response with status 304 if the local copy is current.
 
     Raises
     ------
     requests.exceptions.HTTPError
         If the request fails or the server returns an error status.
     """
+    headers = {}
+    if (DATA_DIR / "nasa_exoplanets.csv").exists():
+        validators = read_validators()
+        if validators.get("ETag"):
+            headers["If-None-Match"] = validators["ETag"]
+        if validators.get("Last-Modified"):
+            headers["If-Modified-Since"] = validators["Last-Modified"]
+
     response = requests.get(
-        "https://exoplanetarchive.ipac.caltech.edu/TAP/sync?query=select+*+from+ps&format=csv", timeout=30
+        "https://exoplanetarchive.ipac.caltech.edu/TAP/sync?query=select+*+from+ps&format=csv",
+        headers=headers, timeout=30
     )
     response.raise_for_status()
     return response
 
 
+def read_validators():
+    """
+    Reads the cache validators saved with the last raw CSV download.
+
+    Returns
+    -------
+    dict
+        ETag and Last-Modified headers, empty if none were saved.
+    """
+    try:
+        with open(DATA_DIR / "nasa_exoplanets.validators.json", "r",
+                  encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+@instrument.traced()
 def get_nasa_data(response):
     """
     Saves raw exoplanet data retrieved from the NASA API to disk.
@@ -94,15 +250,27 @@ def get_nasa_data(response):
     ----------
     response : requests.Response
         Response object containing CSV-formatted exoplanet data.
+        A 304 Not Modified response leaves the existing file as is.
 
     Side Effects
     ------------
-    Writes the file:
+    Writes the files:
         data/nasa_exoplanets.csv
+        data/nasa_exoplanets.validators.json
     """
+    if response.status_code == 304:
+        return
+
     with open(DATA_DIR / "nasa_exoplanets.csv", "w", encoding="utf-8") as f:
         f.write(response.text)
 
+    validators = {name: response.headers[name]
+                  for name in ("ETag", "Last-Modified")
+                  if name in response.headers}
+    with open(DATA_DIR / "nasa_exoplanets.validators.json", "w",
+              encoding="utf-8") as f:
+        json.dump(validators, f, indent=2)
+
 
 def check_duplicates(reader):
     """
@@ -121,15 +289,34 @@ def check_duplicates(reader):
     list of dict
         List of unique exoplanet records.
     """
-    database = []
+    return list(unique_rows(reader))
+
+
+def unique_rows(reader):
+    """
+    Yields exoplanet records, skipping repeated planet names.
+
+    This is the streaming counterpart of `check_duplicates`: only the
+    set of names seen so far is kept in memory, never the records.
+
+    Parameters
+    ----------
+    reader : iterable of dict
+        Exoplanet records, e.g. a csv.DictReader.
+
+    Yields
+    ------
+    dict
+        The first record found for each planet name.
+    """
     set_data = set()
     for row in reader:
         if row["pl_name"] not in set_data:
-            database.append(row)
-            set_data.add(row['pl_name'])
-    return database
+            set_data.add(row["pl_name"])
+            yield row
 
 
+@instrument.traced()
 def all_data_csv():
     """
     Creates a cleaned CSV file without duplicate exoplanet entries.
@@ -153,6 +340,7 @@ def all_data_csv():
             writer.writerow(row)
 
 
+@instrument.traced(rows=len)
 def clean_csv_data():
     """
     Extracts key scientific fields from the exoplanet dataset.
@@ -160,105 +348,296 @@ def clean_csv_data():
     The function removes duplicate entries and keeps only
     relevant astrophysical and discovery-related parameters.
 
+    Returns
+    -------
+    ExoplanetTable
+        The key fields, parsed once into typed columns.
+
     Side Effects
     ------------
     Writes the file:
         data/key_exoplanets.csv
+    and the column bundle data/key_exoplanets.columns/ (see
+    `write_columns`).
     """
     with open(DATA_DIR / "nasa_exoplanets.csv", "r", encoding="utf-8") as f, \
             open(DATA_DIR / "key_exoplanets.csv", "w", encoding="utf-8") as file:
-        fieldnames = [
-            "pl_name",
-            "disc_year",
-            "disc_pubdate",
-            "sy_dist",
-            "discoverymethod",
-            "pl_orbper",
-            "pl_orbsmax",
-            "pl_rade",
-            "pl_masse",
-            "pl_eqt",
-            "pl_insol",
-            "st_teff",
-            "st_mass",
-            "st_rad",
-        ]
+        fieldnames = KEY_FIELDNAMES
         reader = csv.DictReader(f)
         database = check_duplicates(reader)
 
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writeheader()
+        table = ExoplanetTable()
         for row in database:
             important_data = {field: row[field] for field in fieldnames}
             writer.writerow(important_data)
+            table.append(important_data)
+    write_columns(table)
+    return table
+
+
+@instrument.traced(rows=len)
+def stream_csv_data(json_format="pretty"):
+    """
+    Produces every derived dataset in a single pass over the raw CSV.
+
+    Each raw row is sent to all outputs as it is read, so memory stays
+    bounded to the set of planet names used for deduplication. The files
+    are identical to the ones written by `nasa_data_json`, `all_data_csv`,
+    `all_data_json`, `clean_csv_data` and `key_data_json`.
+
+    Parameters
+    ----------
+    json_format : str, optional
+        Layout of the JSON outputs, one of `JSON_FORMATS`. NDJSON
+        outputs are named ``*.ndjson`` instead of ``*.json``.
+
+    Returns
+    -------
+    ExoplanetTable
+        The key fields, parsed once into typed columns.
+
+    Side Effects
+    ------------
+    Writes the files:
+        data/nasa_exoplanets.json
+        data/exoplanets.csv
+        data/exoplanets.json
+        data/key_exoplanets.csv
+        data/key_exoplanets.json
+        data/key_exoplanets.columns/ (see `write_columns`)
+    """
+    with open(DATA_DIR / "nasa_exoplanets.csv", "r", encoding="utf-8") as f, \
+            open(json_output("nasa_exoplanets", json_format), "w", encoding="utf-8") as raw_json, \
+            open(DATA_DIR / "exoplanets.csv", "w", encoding="utf-8") as all_csv, \
+            open(json_output("exoplanets", json_format), "w", encoding="utf-8") as all_json, \
+            open(DATA_DIR / "key_exoplanets.csv", "w", encoding="utf-8") as key_csv, \
+            open(json_output("key_exoplanets", json_format), "w", encoding="utf-8") as key_json:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+
+        raw_writer = JsonRowWriter(raw_json, json_format)
+        all_writer = csv.DictWriter(all_csv, fieldnames=fieldnames)
+        all_json_writer = JsonRowWriter(all_json, json_format)
+        key_writer = csv.DictWriter(key_csv, fieldnames=KEY_FIELDNAMES)
+        key_json_writer = JsonRowWriter(key_json, json_format)
+        table = ExoplanetTable()
+        all_writer.writeheader()
+        key_writer.writeheader()
+
+        def copy_raw(rows):
+            for row in rows:
+                raw_writer.write(row)
+                yield row
+
+        for row in unique_rows(copy_raw(reader)):
+            all_writer.writerow(row)
+            all_json_writer.write(_as_csv_values(row, fieldnames))
+
+            important_data = {field: row[field] for field in KEY_FIELDNAMES}
+            key_writer.writerow(important_data)
+            key_json_writer.write(
+                _as_csv_values(important_data, KEY_FIELDNAMES))
+            table.append(important_data)
+
+        raw_writer.close()
+        all_json_writer.close()
+        key_json_writer.close()
+    write_columns(table)
+    return table
+
+
+def _as_csv_values(row, fieldnames):
+    """
+    Returns a row as it reads back after a round trip through a CSV file.
+
+    Missing cells come back from csv.DictReader as empty strings.
+    """
+    return {
+        field: "" if row.get(field) is None else row[field]
+        for field in fieldnames
+    }
+
+
+# Layouts of the JSON outputs: an indented array (the historical
+# output), an array without whitespace, or one object per line
+JSON_FORMATS = ("pretty", "compact", "ndjson")
 
 
-def write_json(reader, file):
+class JsonRowWriter:
+    """
+    Writes rows to an open file as JSON, one row at a time.
+
+    In the ``pretty`` format the output is identical to
+    ``json.dump(rows, f, indent=2)``, but the rows never have to be held
+    in memory together. ``compact`` writes the same array without
+    whitespace and ``ndjson`` one object per line, with no enclosing
+    array.
+
+    Parameters
+    ----------
+    file : file object
+        Text file opened for writing.
+    json_format : str, optional
+        One of `JSON_FORMATS`.
+    """
+
+    def __init__(self, file, json_format="pretty"):
+        if json_format not in JSON_FORMATS:
+            raise ValueError(f"Unknown JSON format: {json_format}")
+        self.file = file
+        self.json_format = json_format
+        self.count = 0
+
+    def write(self, row):
+        if self.json_format == "pretty":
+            self.file.write(",\n  " if self.count else "[\n  ")
+            self.file.write(json.dumps(row, indent=2).replace("\n", "\n  "))
+        elif self.json_format == "compact":
+            self.file.write("," if self.count else "[")
+            self.file.write(json.dumps(row, separators=(",", ":")))
+        else:
+            self.file.write(json.dumps(row, separators=(",", ":")))
+            self.file.write("\n")
+        self.count += 1
+
+    def close(self):
+        if self.json_format == "pretty":
+            self.file.write("\n]" if self.count else "[]")
+        elif self.json_format == "compact":
+            self.file.write("]" if self.count else "[]")
+
+
+def json_path(name, json_format="pretty"):
+    """
+    Returns the path of a JSON output in `DATA_DIR`.
+
+    NDJSON outputs take the ``.ndjson`` extension, so they are not
+    mistaken for JSON documents.
+    """
+    suffix = ".ndjson" if json_format == "ndjson" else ".json"
+    return DATA_DIR / (name + suffix)
+
+
+def json_output(name, json_format="pretty"):
+    """
+    Returns the path to write a JSON output to.
+
+    The output left by an earlier run in the other extension is removed,
+    so readers never find a stale copy next to the current one.
+    """
+    for other in ("pretty", "ndjson"):
+        if json_path(name, other) != json_path(name, json_format):
+            json_path(name, other).unlink(missing_ok=True)
+    return json_path(name, json_format)
+
+
+def read_json(name):
+    """
+    Reads a JSON output back as a list of rows, whatever its format.
+    """
+    path = json_path(name)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    with open(json_path(name, "ndjson"), "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def write_json(reader, file, json_format="pretty"):
     """
     Converts CSV data to JSON format and writes it to disk.
 
+    Rows are written as they are read, so memory use does not grow
+    with the size of the data.
+
     Parameters
     ----------
     reader : csv.DictReader
         Reader containing CSV-formatted data.
     file : pathlib.Path or str
         Output JSON file path.
+    json_format : str, optional
+        One of `JSON_FORMATS`; see `JsonRowWriter`.
     """
-    json_format = []
-    for row in reader:
-        json_format.append(row)
-
     with open(file, "w", encoding="utf-8") as f:
-        json.dump(json_format, f, indent=2)
+        writer = JsonRowWriter(f, json_format)
+        for row in reader:
+            writer.write(row)
+        writer.close()
 
 
-def nasa_data_json():
+@instrument.traced()
+def nasa_data_json(json_format="pretty"):
     """
     Converts the raw NASA exoplanet CSV dataset to JSON format.
 
+    Parameters
+    ----------
+    json_format : str, optional
+        One of `JSON_FORMATS`.
+
     Side Effects
     ------------
     Writes the file:
-        data/nasa_exoplanets.json
+        data/nasa_exoplanets.json (.ndjson for NDJSON)
     """
     with open(DATA_DIR / "nasa_exoplanets.csv", "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
-        write_json(reader, DATA_DIR / "nasa_exoplanets.json")
+        write_json(reader, json_output("nasa_exoplanets", json_format),
+                   json_format)
 
 
 #####
-def all_data_json():
+@instrument.traced()
+def all_data_json(json_format="pretty"):
     """
     Converts the deduplicated exoplanet CSV dataset to JSON format.
 
+    Parameters
+    ----------
+    json_format : str, optional
+        One of `JSON_FORMATS`.
+
     Side Effects
     ------------
     Writes the file:
-        data/exoplanets.json
+        data/exoplanets.json (.ndjson for NDJSON)
     """
     with open(DATA_DIR / "exoplanets.csv", "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
-        write_json(reader, DATA_DIR / "exoplanets.json")
+        write_json(reader, json_output("exoplanets", json_format), json_format)
 
 
-def key_data_json():
+@instrument.traced()
+def key_data_json(json_format="pretty"):
     """
     Converts the cleaned and filtered exoplanet dataset to JSON format.
 
+    Parameters
+    ----------
+    json_format : str, optional
+        One of `JSON_FORMATS`.
+
     Side Effects
     ------------
     Writes the file:
-        data/key_exoplanets.json
+        data/key_exoplanets.json (.ndjson for NDJSON)
     """
     with open(DATA_DIR / "key_exoplanets.csv", "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
-        write_json(reader, DATA_DIR / "key_exoplanets.json")
+        write_json(reader, json_output("key_exoplanets", json_format),
+                   json_format)
 
 
 def sort_data(funct):
     """
     Sorts exoplanet data using a custom sorting function.
 
+    The report functions sort an `ExoplanetTable` instead; this helper
+    is kept for callers that work with plain records.
+
     Parameters
     ----------
     funct : callable
@@ -269,12 +648,500 @@ def sort_data(funct):
     list of dict
         Sorted list of exoplanet records.
     """
-    with open(DATA_DIR / "key_exoplanets.json", "r", encoding="utf-8") as file:
-        data = json.load(file)
-    return sorted(data, key=funct)
+    return sorted(read_json("key_exoplanets"), key=funct)
+
+
+# Heap selection beats a full sort for slices of up to about 1/16 of
+# the ranked rows
+HEAP_SELECT_RATIO = 16
+
+
+class ExoplanetTable:
+    """
+    Typed, column-oriented store of the key exoplanet dataset.
+
+    Every field is parsed exactly once when a row is appended. Numeric
+    fields live in contiguous ``array('d')`` columns, with NaN marking a
+    missing value; text fields are lists of strings, with an empty string
+    marking a missing value.
+
+    Attributes
+    ----------
+    columns : dict
+        Maps each field in `KEY_FIELDNAMES` to its column.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        for field in KEY_FIELDNAMES:
+            self.columns[field] = array("d") if field in NUMERIC_FIELDS else []
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a table from an iterable of exoplanet records.
+
+        Parameters
+        ----------
+        rows : iterable of dict
+            Records holding at least the fields in `KEY_FIELDNAMES`.
+
+        Returns
+        -------
+        ExoplanetTable
+        """
+        table = cls()
+        for row in rows:
+            table.append(row)
+        return table
+
+    def __len__(self):
+        return len(self.columns["pl_name"])
+
+    def append(self, row):
+        """
+        Parses a single record and appends it to every column.
+
+        Parameters
+        ----------
+        row : dict
+            Record with string values, as produced by csv.DictReader.
+        """
+        for field, column in self.columns.items():
+            value = row[field]
+            if field in NUMERIC_FIELDS:
+                column.append(float(value) if value else NAN)
+            else:
+                column.append(value or "")
+
+    def value(self, field, index):
+        """
+        Returns a single cell, or None when the value is missing.
+        """
+        value = self.columns[field][index]
+        return value if _is_present(value) else None
+
+    def argsort(self, field):
+        """
+        Returns the row order that sorts the table by one field.
+
+        Rows with a value come first in ascending order, followed by
+        rows without one in their original order. Ties keep their
+        original order, exactly like sorting the records themselves.
+
+        Parameters
+        ----------
+        field : str
+            Name of the column to sort by.
+
+        Returns
+        -------
+        list of int
+            Row indices in sorted order.
+        """
+        column = self.columns[field]
+        present = [i for i, value in enumerate(column) if _is_present(value)]
+        missing = [i for i, value in enumerate(column)
+                   if not _is_present(value)]
+        present.sort(key=column.__getitem__)
+        return present + missing
+
+    def select(self, field, start, stop):
+        """
+        Returns the rows ranked `start` to `stop` (excluded) by one field.
+
+        Only rows with a value are ranked, in the order of `argsort`, so
+        ``select(field, 0, n)`` gives the first n rows with data. The
+        rows are picked with a heap, in O(n log k) for a slice of k
+        rows at either end, instead of sorting the whole column; slices
+        reaching deeper than 1 / `HEAP_SELECT_RATIO` of the ranked rows
+        are cut from a full sort, which is faster there.
+
+        Parameters
+        ----------
+        field : str
+            Name of the column to rank by.
+        start, stop : int
+            Ranks of the slice, counted from 0.
+
+        Returns
+        -------
+        list of int
+            Row indices in sorted order.
+        """
+        column = self.columns[field]
+        present = [i for i, value in enumerate(column) if _is_present(value)]
+        stop = min(stop, len(present))
+        if start >= stop:
+            return []
+        if min(stop, len(present) - start) > len(present) // HEAP_SELECT_RATIO:
+            # A heap only pays off for slices near either end
+            present.sort(key=column.__getitem__)
+            return present[start:stop]
+        if stop <= len(present) - start:
+            return heapq.nsmallest(stop, present,
+                                   key=column.__getitem__)[start:]
+        # Closer to the end: take the largest and reverse them, breaking
+        # ties by row so equal values keep their original order
+        largest = heapq.nlargest(len(present) - start, present,
+                                 key=lambda i: (column[i], i))
+        return largest[::-1][:stop - start]
+
+    def count(self, field):
+        """
+        Returns the number of rows with a value for one field.
+        """
+        return sum(1 for value in self.columns[field] if _is_present(value))
+
+
+def _is_present(value):
+    """
+    Tells whether a column cell holds data (NaN and "" mean missing).
+    """
+    return value == value and value != ""
+
+
+@instrument.traced(rows=len)
+def load_key_table():
+    """
+    Loads the key exoplanet dataset into an `ExoplanetTable`.
+
+    The column bundle is used when it matches the current CSV, so the
+    text is not parsed again; otherwise the CSV is read.
+
+    Returns
+    -------
+    ExoplanetTable
+        Table built from data/key_exoplanets.csv.
+    """
+    columns = open_columns()
+    if columns is not None:
+        return _table_from_columns(columns)
+
+    with open(DATA_DIR / "key_exoplanets.csv", "r", encoding="utf-8") as f:
+        return ExoplanetTable.from_rows(csv.DictReader(f))
+
+
+COLUMNS_DIR = "key_exoplanets.columns"
+
+# .npy element types of the bundle: little-endian float64 for numeric
+# fields; int64 offsets into a uint8 UTF-8 blob for text fields
+_NPY_TYPES = {"<f8": "d", "<i8": "q", "|u1": "B"}
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def write_columns(table):
+    """
+    Writes the key dataset as a bundle of memory-mappable columns.
+
+    Every column is a ``.npy`` file (format 1.0) that NumPy can open
+    with ``numpy.load(path, mmap_mode="r")`` and `open_columns` maps
+    without NumPy. Numeric fields are float64 arrays with NaN for
+    missing values. Text fields are a string table: ``<field>.data.npy``
+    holds the UTF-8 bytes of all values back to back and
+    ``<field>.offsets.npy`` the n + 1 offsets delimiting them. A
+    ``manifest.json`` records the row count and the size and
+    modification time of data/key_exoplanets.csv, so a stale bundle
+    is never read. The bundle is built next to the old one and swapped
+    in at the end.
+
+    Parameters
+    ----------
+    table : ExoplanetTable
+        Key dataset, as written to data/key_exoplanets.csv.
+
+    Side Effects
+    ------------
+    Replaces the directory data/key_exoplanets.columns/.
+    """
+    target = DATA_DIR / COLUMNS_DIR
+    new = target.with_name(target.name + ".new")
+    shutil.rmtree(new, ignore_errors=True)
+    new.mkdir()
+
+    files = {}
+    for field, column in table.columns.items():
+        files[field] = names = column_files(field)
+        if field in NUMERIC_FIELDS:
+            _write_npy(new / names["values"], "<f8", column)
+            continue
+
+        offsets = array("q", [0])
+        blob = bytearray()
+        for value in column:
+            blob += value.encode("utf-8")
+            offsets.append(len(blob))
+        _write_npy(new / names["offsets"], "<i8", offsets)
+        _write_npy(new / names["data"], "|u1", array("B", blob))
+
+    source = (DATA_DIR / "key_exoplanets.csv").stat()
+    manifest = {"rows": len(table), "columns": files,
+                "source": {"size": source.st_size,
+                           "mtime_ns": source.st_mtime_ns}}
+    with open(new / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(new, target)
+
+
+def column_files(field):
+    """
+    Names the files holding a field in the column bundle.
+
+    Returns
+    -------
+    dict
+        ``{"values": name}`` for a numeric field, ``{"offsets": name,
+        "data": name}`` for a text field.
+    """
+    if field in NUMERIC_FIELDS:
+        return {"values": f"{field}.npy"}
+    return {"offsets": f"{field}.offsets.npy", "data": f"{field}.data.npy"}
+
+
+def _write_npy(path, descr, values):
+    """
+    Writes a one-dimensional array as a .npy file (format version 1.0).
+    """
+    if sys.byteorder == "big" and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    header = repr({"descr": descr, "fortran_order": False,
+                   "shape": (len(values),)})
+    # The data starts on a 64-byte boundary; the header ends with "\n"
+    padding = -(len(_NPY_MAGIC) + 2 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(_NPY_MAGIC + struct.pack("<H", len(header)) + header)
+        f.write(values.tobytes())
+
+
+def _read_npy(path):
+    """
+    Memory-maps a .npy file written by `_write_npy`.
+
+    Returns
+    -------
+    memoryview
+        Read-only view of the elements, without copying them.
+
+    Raises
+    ------
+    ValueError
+        If the file is empty, truncated or not such a .npy file.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(_NPY_MAGIC)] != _NPY_MAGIC:
+        raise ValueError(f"{path.name} is not a version 1.0 .npy file")
+    start = len(_NPY_MAGIC) + 2
+    try:
+        (header_length,) = struct.unpack(
+            "<H", buffer[len(_NPY_MAGIC):start])
+        header = ast.literal_eval(
+            buffer[start:start + header_length].decode("latin-1"))
+        typecode = _NPY_TYPES[header["descr"]]
+        if sys.byteorder == "big" and typecode != "B":
+            raise ValueError("Column bundles are little-endian")
+        return memoryview(buffer)[start + header_length:].cast(typecode)
+    except (struct.error, SyntaxError, KeyError, TypeError) as error:
+        raise ValueError(f"{path.name} has a malformed header") from error
+
+
+class StringColumn:
+    """
+    Text column of a bundle, decoded one value at a time on access.
+
+    Parameters
+    ----------
+    offsets : memoryview
+        n + 1 int64 offsets into `data`.
+    data : memoryview
+        UTF-8 bytes of every value, back to back.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return bytes(self.data[self.offsets[index]:
+                               self.offsets[index + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        data = bytes(self.data)
+        offsets = self.offsets
+        for i in range(len(self)):
+            yield data[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+    def __reduce__(self):
+        # Mapped memory cannot be pickled; worker processes get a list
+        return list, (list(self),)
+
+
+def open_columns():
+    """
+    Maps the column bundle of the key dataset into memory.
+
+    Nothing is parsed or copied: numeric columns are float64
+    memoryviews (NaN for missing values) and text columns are
+    `StringColumn` objects, both indexed by row and sliceable.
+
+    Returns
+    -------
+    dict or None
+        Maps each field in `KEY_FIELDNAMES` to its column, or None when
+        there is no bundle, it is older than data/key_exoplanets.csv or
+        one of its files is missing or damaged; the caller then reads
+        the CSV and the next pipeline run rebuilds the bundle.
+    """
+    directory = DATA_DIR / COLUMNS_DIR
+    try:
+        with open(directory / "manifest.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        source = (DATA_DIR / "key_exoplanets.csv").stat()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifest["source"] != {"size": source.st_size,
+                              "mtime_ns": source.st_mtime_ns}:
+        return None
+
+    columns = {}
+    try:
+        for field, files in manifest["columns"].items():
+            if "values" in files:
+                columns[field] = _read_npy(directory / files["values"])
+            else:
+                columns[field] = StringColumn(
+                    _read_npy(directory / files["offsets"]),
+                    _read_npy(directory / files["data"]))
+    except (FileNotFoundError, ValueError):
+        return None
+    return columns
+
+
+def _table_from_columns(columns):
+    """
+    Builds a read-only `ExoplanetTable` over mapped columns.
+
+    Numeric columns are copied as raw bytes into arrays; text columns
+    stay mapped and are decoded as they are read.
+    """
+    table = ExoplanetTable()
+    for field in KEY_FIELDNAMES:
+        if field in NUMERIC_FIELDS:
+            table.columns[field].frombytes(columns[field].cast("B"))
+        else:
+            table.columns[field] = columns[field]
+    return table
+
+
+def write_report(table, field, filename, title, entry, top=None,
+                 window=None):
+    """
+    Writes a text report listing every exoplanet sorted by one field.
+
+    With `top` or `window` only a slice of the planets with data is
+    listed (see `report_ranks`), keeping their rank in the full order.
+
+    Parameters
+    ----------
+    table : ExoplanetTable or None
+        Key dataset. When None it is loaded with `load_key_table`.
+    field : str
+        Field the report is sorted by.
+    filename : str
+        Name of the report file inside `DATA_DIR`.
+    title : str
+        Heading written at the top of the file.
+    entry : callable
+        Formats one line as ``entry(position, name, value)``, where
+        value is None when the planet has no data for the field.
+    top : int, optional
+        List only the first `top` planets with data.
+    window : tuple of float, optional
+        List only the planets with data between these two percentiles.
+    """
+    if table is None:
+        table = load_key_table()
+    start, order = _report_order(table, field, top, window)
+    _render_report(DATA_DIR / filename, title, entry,
+                   table.columns["pl_name"], table.columns[field],
+                   order, start)
+
+
+def report_ranks(count, top=None, window=None):
+    """
+    Returns the ranks a sliced report lists.
+
+    Parameters
+    ----------
+    count : int
+        Number of planets with data for the report's field.
+    top : int, optional
+        Keep the first `top` of them.
+    window : tuple of float, optional
+        Keep the ones from the `window[0]` to the `window[1]`
+        percentile; ``(90, 100)`` is the top decile.
+
+    Returns
+    -------
+    tuple of int or None
+        The start and stop ranks, counted from 0, or None when the
+        report lists every planet.
+    """
+    if window is not None:
+        low, high = window
+        start, stop = math.floor(count * low / 100), \
+            math.ceil(count * high / 100)
+        if top is not None:
+            stop = min(stop, start + top)
+        return start, stop
+    if top is not None:
+        return 0, top
+    return None
+
+
+def _report_order(table, field, top=None, window=None):
+    """
+    Returns the first rank and the row order of a report.
+    """
+    if top is None and window is None:
+        return 0, table.argsort(field)
+    start, stop = report_ranks(table.count(field), top, window)
+    return start, table.select(field, start, stop)
+
+
+def _report_stage(filename):
+    """
+    Names the pipeline stage writing a report after its file.
+    """
+    return "report:" + Path(filename).stem
+
+
+def _render_report(path, title, entry, names, column, order, start=0):
+    """
+    Writes a report file from a precomputed sort order.
 
+    `start` is the rank of the first row of `order`, for sliced reports.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(title)
+        for i, index in enumerate(order, start=start + 1):
+            value = column[index]
+            file.write(entry(i, names[index],
+                             value if _is_present(value) else None))
 
-def exoplanets_distance():
+
+def exoplanets_distance(table=None):
     """
     Generates a distance-based report of exoplanets relative to Earth.
 
@@ -284,84 +1151,82 @@ def exoplanets_distance():
     - Light-years
     - Parsecs
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_distance.txt
     """
-    def funct(x): return float(x['sy_dist']) if x['sy_dist'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_distance.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Distance From Earth\n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['sy_dist'] and exoplanet['sy_dist'] != MISSING_VALUE:
-
-                km = (float(exoplanet['sy_dist']) * PARSEC_M) / 1000
-                au = float(exoplanet['sy_dist']) * AU_PER_PARSEC
-                light_years = float(
-                    exoplanet['sy_dist']) * LIGHTYEARS_PER_PARSEC
-                parsecs = float(exoplanet['sy_dist'])
-
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tKM: {km:,.0f} \n"
-                    f"\tAU: {au:,.0f} \n"
-                    f"\tLight Years: {light_years:,.2f} \n"
-                    f"\tParsecs: {parsecs:,.2f}\n")
-            else:
-                file.write(f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data\n")
+    write_report(table, *REPORTS["distance"])
+
+
+def _distance_entry(i, name, parsecs):
+    if parsecs is None:
+        return f"{i}) Name: {name}: \n\tNo data\n"
 
+    km = (parsecs * PARSEC_M) / 1000
+    au = parsecs * AU_PER_PARSEC
+    light_years = parsecs * LIGHTYEARS_PER_PARSEC
+    return (f"{i}) Name: {name}: \n"
+            f"\tKM: {km:,.0f} \n"
+            f"\tAU: {au:,.0f} \n"
+            f"\tLight Years: {light_years:,.2f} \n"
+            f"\tParsecs: {parsecs:,.2f}\n")
 
-def discovery_year():  # disc_year
+
+def discovery_year(table=None):  # disc_year
     """
     Generates a report of exoplanets sorted by discovery year.
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_discovery.txt
     """
-    def funct(x): return float(x['disc_year']
-                               ) if x['disc_year'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_discovery.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Discover Years in Order\n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['disc_year'] and exoplanet['disc_year'] != MISSING_VALUE:
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tDiscovery Year: {exoplanet['disc_year']}\n")
-            else:
-                file.write(f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data\n")
+    write_report(table, *REPORTS["discovery"])
 
 
-def publication_date():  # disc_pubdate
+def _discovery_entry(i, name, year):
+    if year is None:
+        return f"{i}) Name: {name}: \n\tNo data\n"
+    return (f"{i}) Name: {name}: \n"
+            f"\tDiscovery Year: {year:.0f}\n")
+
+
+def publication_date(table=None):  # disc_pubdate
     """
     Generates a report of exoplanets sorted by publication date.
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_publication.txt
     """
-    def funct(
-        x): return x['disc_pubdate'] if x['disc_pubdate'] else "9999-12-31"
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_publication.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Publication Date in Order\n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['disc_pubdate'] and exoplanet['disc_pubdate'] != "9999-12-31":
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tPublication Date: {exoplanet['disc_pubdate']}\n")
-            else:
-                file.write(f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data\n")
+    write_report(table, *REPORTS["publication"])
+
+
+def _publication_entry(i, name, date):
+    if date is None or date == "9999-12-31":
+        return f"{i}) Name: {name}: \n\tNo data\n"
+    return (f"{i}) Name: {name}: \n"
+            f"\tPublication Date: {date}\n")
 
 
-def size_exoplanets():  # pl_rade
+def size_exoplanets(table=None):  # pl_rade
     """
     Generates a report of exoplanets sorted by planetary radius.
 
@@ -369,29 +1234,30 @@ def size_exoplanets():  # pl_rade
     - Earth radii (R⊕)
     - Kilometers
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_size.txt
     """
-    def funct(x): return float(x['pl_rade']) if x['pl_rade'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_size.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Size From Smaller to Biggest\n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['pl_rade'] and exoplanet['pl_rade'] != MISSING_VALUE:
-                exoplanet_radius = float(
-                    exoplanet['pl_rade']) * EARTH_RADIUS_KM
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tRadius (R⊕): {float(exoplanet['pl_rade']):,.2f} \n"
-                    f"\tRadius (km): {exoplanet_radius:,.0f} \n")
-            else:
-                file.write(f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data\n")
+    write_report(table, *REPORTS["size"])
+
+
+def _size_entry(i, name, radius):
+    if radius is None:
+        return f"{i}) Name: {name}: \n\tNo data\n"
+
+    exoplanet_radius = radius * EARTH_RADIUS_KM
+    return (f"{i}) Name: {name}: \n"
+            f"\tRadius (R⊕): {radius:,.2f} \n"
+            f"\tRadius (km): {exoplanet_radius:,.0f} \n")
 
 
-def orbital_period():  # pl_orbper
+def orbital_period(table=None):  # pl_orbper
     """
     Generates a report of exoplanets sorted by orbital period.
 
@@ -401,39 +1267,36 @@ def orbital_period():  # pl_orbper
 
     Periods longer than 10,000 days are marked as estimated.
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_orbital_period.txt
     """
-    def funct(x): return float(x['pl_orbper']
-                               ) if x['pl_orbper'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_orbital_period.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Orbital Period\n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['pl_orbper'] and exoplanet['pl_orbper'] != MISSING_VALUE:
-                if float(exoplanet['pl_orbper']) < 10_000:
-                    earth_years = float(exoplanet['pl_orbper']) / EARTH_YEAR
-                    file.write(
-                        f"{i}) Name: {exoplanet['pl_name']}: \n"
-                        f"\tOrbital Period (days): {float(exoplanet['pl_orbper']):,.2f} \n"
-                        f"\tEarth Years: {earth_years:,.4f} \n")
-
-                elif exoplanet['pl_orbper'] and float(exoplanet['pl_orbper']) > 10_000:
-                    earth_years = float(exoplanet['pl_orbper']) / EARTH_YEAR
-                    file.write(
-                        f"{i}) Name: {exoplanet['pl_name']}: \n"
-                        f"\tOrbital Period (days): (estimated) {float(exoplanet['pl_orbper']):,.2f} \n"
-                        f"\tEarth Years: (estimated) {earth_years:,.4f} \n")
+    write_report(table, *REPORTS["orbital_period"])
 
-            else:
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data \n")
 
+def _orbital_period_entry(i, name, days):
+    if days is None:
+        return f"{i}) Name: {name}: \n\tNo data \n"
+
+    earth_years = days / EARTH_YEAR
+    if days < 10_000:
+        return (f"{i}) Name: {name}: \n"
+                f"\tOrbital Period (days): {days:,.2f} \n"
+                f"\tEarth Years: {earth_years:,.4f} \n")
+    if days > 10_000:
+        return (f"{i}) Name: {name}: \n"
+                f"\tOrbital Period (days): (estimated) {days:,.2f} \n"
+                f"\tEarth Years: (estimated) {earth_years:,.4f} \n")
+    return ""
 
-def exoplanets_mass():  # pl_masse
+
+def exoplanets_mass(table=None):  # pl_masse
     """
     Generates a report of exoplanets sorted by planetary mass.
 
@@ -441,30 +1304,30 @@ def exoplanets_mass():  # pl_masse
     - Earth masses (M⊕)
     - Kilograms
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_mass.txt
     """
-    def funct(x): return float(
-        x['pl_masse']) if x['pl_masse'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_mass.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Mass in Order \n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['pl_masse'] and exoplanet['pl_masse'] != MISSING_VALUE:
-                mass_kg = (float(exoplanet['pl_masse']) * EARTH_MASS_KG)
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tMass (M⊕): {float(exoplanet['pl_masse']):,.2f} \n"
-                    f"\tMass (kg): {mass_kg:,.0f} \n")
-            else:
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data \n")
+    write_report(table, *REPORTS["mass"])
 
 
-def stars_mass():  # st_mass
+def _mass_entry(i, name, mass):
+    if mass is None:
+        return f"{i}) Name: {name}: \n\tNo data \n"
+
+    mass_kg = mass * EARTH_MASS_KG
+    return (f"{i}) Name: {name}: \n"
+            f"\tMass (M⊕): {mass:,.2f} \n"
+            f"\tMass (kg): {mass_kg:,.0f} \n")
+
+
+def stars_mass(table=None):  # st_mass
     """
     Generates a report of host star masses.
 
@@ -473,34 +1336,32 @@ def stars_mass():  # st_mass
     - Kilograms
     - Earth masses (M⊕)
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_star_mass.txt
     """
-    def funct(x): return float(
-        x['st_mass']) if x['st_mass'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_star_mass.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Star's Mass in Order \n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['st_mass'] and exoplanet['st_mass'] != MISSING_VALUE:
-                mass_kg = (
-                    float(exoplanet['st_mass']) * SOLAR_MASS_KG)
-                planet_mass = mass_kg / EARTH_MASS_KG
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tStellar Mass (M☉): {float(exoplanet['st_mass']):,.3f} \n"
-                    f"\tMass (kg): {mass_kg:,.0f} \n"
-                    f"\tPlanet Mass (M⊕): {planet_mass:,.0f} \n")
+    write_report(table, *REPORTS["star_mass"])
 
-            else:
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data \n")
 
+def _star_mass_entry(i, name, mass):
+    if mass is None:
+        return f"{i}) Name: {name}: \n\tNo data \n"
+
+    mass_kg = mass * SOLAR_MASS_KG
+    planet_mass = mass_kg / EARTH_MASS_KG
+    return (f"{i}) Name: {name}: \n"
+            f"\tStellar Mass (M☉): {mass:,.3f} \n"
+            f"\tMass (kg): {mass_kg:,.0f} \n"
+            f"\tPlanet Mass (M⊕): {planet_mass:,.0f} \n")
 
-def insolation():  # pl_insol
+
+def insolation(table=None):  # pl_insol
     """
     Generates a report of incident stellar flux on exoplanets.
 
@@ -508,27 +1369,412 @@ def insolation():  # pl_insol
     - Earth insolation units (S⊕)
     - Watts per square meter (W/m²)
 
+    Parameters
+    ----------
+    table : ExoplanetTable, optional
+        Key dataset; loaded from disk when omitted.
+
     Side Effects
     ------------
     Writes the file:
         data/exoplanets_insolation.txt
     """
-    def funct(x): return float(
-        x['pl_insol']) if x['pl_insol'] else MISSING_VALUE
-    data = sort_data(funct)
-
-    with open(DATA_DIR / "exoplanets_insolation.txt", "w", encoding="utf-8") as file:
-        file.write("List of Exoplanets Incident Stellar Flux in Order \n\n")
-        for i, exoplanet in enumerate(data, start=1):
-            if exoplanet['pl_insol'] and exoplanet['pl_insol'] != MISSING_VALUE:
-                wm2 = float(exoplanet['pl_insol']) * EARTH_FLUX_W_M2
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n"
-                    f"\tInsolation (S⊕): {float(exoplanet['pl_insol']):,.4f} \n"
-                    f"\tIncident Stellar Flux (W/m²): {wm2:,.2f} \n")
-            else:
-                file.write(
-                    f"{i}) Name: {exoplanet['pl_name']}: \n\tNo data \n")
+    write_report(table, *REPORTS["insolation"])
+
+
+def _insolation_entry(i, name, flux):
+    if flux is None:
+        return f"{i}) Name: {name}: \n\tNo data \n"
+
+    wm2 = flux * EARTH_FLUX_W_M2
+    return (f"{i}) Name: {name}: \n"
+            f"\tInsolation (S⊕): {flux:,.4f} \n"
+            f"\tIncident Stellar Flux (W/m²): {wm2:,.2f} \n")
+
+
+# Report name -> (sorted field, output file, title, line formatter)
+REPORTS = {
+    "distance": (
+        "sy_dist", "exoplanets_distance.txt",
+        "List of Exoplanets Distance From Earth\n\n", _distance_entry),
+    "discovery": (
+        "disc_year", "exoplanets_discovery.txt",
+        "List of Exoplanets Discover Years in Order\n\n", _discovery_entry),
+    "publication": (
+        "disc_pubdate", "exoplanets_publication.txt",
+        "List of Exoplanets Publication Date in Order\n\n",
+        _publication_entry),
+    "size": (
+        "pl_rade", "exoplanets_size.txt",
+        "List of Exoplanets Size From Smaller to Biggest\n\n", _size_entry),
+    "orbital_period": (
+        "pl_orbper", "exoplanets_orbital_period.txt",
+        "List of Exoplanets Orbital Period\n\n", _orbital_period_entry),
+    "mass": (
+        "pl_masse", "exoplanets_mass.txt",
+        "List of Exoplanets Mass in Order \n\n", _mass_entry),
+    "star_mass": (
+        "st_mass", "exoplanets_star_mass.txt",
+        "List of Exoplanets Star's Mass in Order \n\n", _star_mass_entry),
+    "insolation": (
+        "pl_insol", "exoplanets_insolation.txt",
+        "List of Exoplanets Incident Stellar Flux in Order \n\n",
+        _insolation_entry),
+}
+
+
+BUILD_MANIFEST = "build_manifest.json"
+
+
+class BuildCache:
+    """
+    Remembers what every output of the pipeline was built from.
+
+    A stage is identified by a key hashing the contents of its input
+    files, the source of the modules that produce it and its options.
+    The manifest, data/build_manifest.json, maps each stage to the key
+    it was last built with and the size and modification time of its
+    outputs; a stage whose key is unchanged and whose outputs are
+    untouched is up to date and can be skipped.
+
+    Input files are hashed in full only when their size or
+    modification time changed since they were last hashed, so checking
+    an unchanged pipeline reads no data.
+
+    Parameters
+    ----------
+    rebuild : bool, optional
+        Ignore the previous manifest, so every stage is out of date.
+    """
+
+    def __init__(self, rebuild=False):
+        self.path = DATA_DIR / BUILD_MANIFEST
+        self.manifest = {"files": {}, "stages": {}}
+        if rebuild:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def file_hash(self, name):
+        """
+        Returns the SHA-256 of a file in `DATA_DIR`, or None if absent.
+        """
+        try:
+            stat = (DATA_DIR / name).stat()
+        except FileNotFoundError:
+            return None
+        known = self.manifest["files"].get(name)
+        if known and known["size"] == stat.st_size and \
+                known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        digest = hashlib.sha256()
+        with open(DATA_DIR / name, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self.manifest["files"][name] = {
+            "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def stage_key(self, inputs, code, options):
+        """
+        Returns the key of a stage.
+
+        Parameters
+        ----------
+        inputs : list of str
+            Input files, relative to `DATA_DIR`.
+        code : list of module
+            Modules whose source defines the stage. Whole files are
+            hashed, so the constants and helpers the stage uses are
+            covered along with its functions.
+        options : list
+            JSON-serializable options the outputs depend on.
+        """
+        digest = hashlib.sha256()
+        for name in inputs:
+            digest.update(f"{name}:{self.file_hash(name)}\n".encode())
+        for module in code:
+            digest.update(Path(module.__file__).read_bytes())
+        digest.update(json.dumps(options).encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_fresh(self, stage, key):
+        """
+        Tells whether a stage was built with `key` and its outputs are
+        as it left them.
+        """
+        built = self.manifest["stages"].get(stage)
+        if built is None or built["key"] != key:
+            return False
+        return all(self._output_stat(name) == stat
+                   for name, stat in built["outputs"].items())
+
+    def record(self, stage, key, outputs):
+        """
+        Records that a stage was just built with `key`.
+
+        Parameters
+        ----------
+        outputs : list of str
+            Files written by the stage, relative to `DATA_DIR`.
+        """
+        self.manifest["stages"][stage] = {
+            "key": key,
+            "outputs": {name: self._output_stat(name) for name in outputs},
+        }
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _output_stat(name):
+        try:
+            stat = (DATA_DIR / name).stat()
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+
+class PipelineStage:
+    """
+    One step of the pipeline, with the files it reads and writes.
+
+    Parameters
+    ----------
+    name : str
+        Unique name, also used in the build manifest and in traces.
+    function : callable
+        Runs the stage. It must be picklable, to run in a worker
+        process, and reads and writes its files in `DATA_DIR`.
+    inputs, outputs : list of str
+        Files read and written, relative to `DATA_DIR`. A stage runs
+        after the stages producing its inputs.
+    code : list of module, optional
+        Modules whose source defines the outputs. A stage without code
+        always runs; see `BuildCache.stage_key`.
+    options : list, optional
+        JSON-serializable options the outputs depend on.
+    """
+
+    def __init__(self, name, function, inputs=(), outputs=(), code=(),
+                 options=()):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.options = list(options)
+
+
+def download():
+    """
+    Downloads the raw dataset unless the archive copy is unchanged.
+    """
+    get_nasa_data(fetch_nasa_data())
+
+
+# Modules whose source every output depends on: this one, with its
+# helpers and constants, and the unit conversions shared with the scripts
+PIPELINE_CODE = [sys.modules[__name__], units]
+
+
+def pipeline_stages(json_format="pretty", top=None, window=None):
+    """
+    Declares the stages of `main` as a graph of files.
+
+    The download feeds the single pass deriving the datasets, which
+    feeds every report; the reports are independent of each other.
+
+    Returns
+    -------
+    list of PipelineStage
+    """
+    datasets = [json_path(name, json_format).name
+                for name in ("nasa_exoplanets", "exoplanets", "key_exoplanets")]
+    datasets += ["exoplanets.csv", "key_exoplanets.csv",
+                 f"{COLUMNS_DIR}/manifest.json"]
+    # Every file of the bundle, so a deleted one gets it rebuilt
+    datasets += [f"{COLUMNS_DIR}/{name}" for field in KEY_FIELDNAMES
+                 for name in column_files(field).values()]
+    stages = [
+        PipelineStage("download", download, outputs=["nasa_exoplanets.csv"]),
+        PipelineStage(
+            "datasets", functools.partial(stream_csv_data, json_format),
+            inputs=["nasa_exoplanets.csv"], outputs=datasets,
+            code=PIPELINE_CODE,
+            options=[json_format]),
+    ]
+    for report in REPORTS.values():
+        field, filename, title, entry = report
+        stages.append(PipelineStage(
+            _report_stage(filename),
+            functools.partial(write_report, None, *report, top, window),
+            inputs=["key_exoplanets.csv"], outputs=[filename],
+            code=PIPELINE_CODE,
+            options=[field, filename, title, top, window]))
+    return stages
+
+
+def run_pipeline(stages, jobs=None, cache=None):
+    """
+    Runs a graph of stages, each as soon as its inputs are ready.
+
+    Ready stages run concurrently in a pool of `jobs` worker
+    processes. With a `cache`, up-to-date stages are skipped and every
+    stage run is recorded in the build manifest. When all stages are
+    done the critical path, the chain of dependent stages that bounds
+    the wall time, is printed.
+
+    Parameters
+    ----------
+    stages : list of PipelineStage
+        Stages in any order; every input must be produced by another
+        stage or already exist.
+    jobs : int, optional
+        Worker processes. Defaults to the CPU count; ``1`` runs the
+        stages one after another in this process.
+    cache : BuildCache, optional
+        Build manifest of the data directory.
+
+    Returns
+    -------
+    dict
+        Maps each stage name to its duration in seconds, None for the
+        skipped ones.
+    """
+    producers = {output: stage.name
+                 for stage in stages for output in stage.outputs}
+    depends = {stage.name: {producers[name] for name in stage.inputs
+                            if name in producers}
+               for stage in stages}
+    waiting = {stage.name: stage for stage in stages}
+    durations = {}
+    running = {}
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    options = instrument.options()
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 \
+        else _InlineExecutor()
+    with executor:
+        while waiting or running:
+            ready = [stage for name, stage in waiting.items()
+                     if depends[name] <= durations.keys()]
+            for stage in ready:
+                del waiting[stage.name]
+                key = None
+                if cache is not None and stage.code:
+                    key = cache.stage_key(stage.inputs, stage.code,
+                                          stage.options)
+                    if cache.is_fresh(stage.name, key):
+                        durations[stage.name] = None
+                        continue
+                future = executor.submit(_run_pipeline_stage, DATA_DIR,
+                                         options, stage.name, stage.function)
+                running[future] = stage, key
+            if not running:
+                if waiting and not ready:
+                    raise ValueError("Pipeline stages depend on each other: "
+                                     + ", ".join(waiting))
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                records, seconds = future.result()
+                instrument.add_records(records)
+                durations[stage.name] = seconds
+                if key is not None:
+                    cache.record(stage.name, key, stage.outputs)
+                    cache.save()
+
+    path = critical_path(depends, durations)
+    if path:
+        total = sum(durations[name] for name in path)
+        print("Critical path: " + " -> ".join(
+            f"{name} ({durations[name]:.2f} s)" for name in path)
+            + f" = {total:.2f} s")
+    return durations
+
+
+def critical_path(depends, durations):
+    """
+    Returns the chain of dependent stages that took the longest.
+
+    Parameters
+    ----------
+    depends : dict
+        Maps each stage name to the names of the stages it depends on.
+    durations : dict
+        Maps each stage name to its duration, None if it was skipped.
+
+    Returns
+    -------
+    list of str
+        Stage names, in running order; skipped stages are left out.
+    """
+    finish = {}
+    previous = {}
+
+    def finish_time(name):
+        if name not in finish:
+            before = max(depends[name], key=finish_time, default=None)
+            previous[name] = before
+            finish[name] = (finish_time(before) if before else 0.0) + \
+                (durations.get(name) or 0.0)
+        return finish[name]
+
+    last = max(depends, key=finish_time, default=None)
+    path = []
+    while last is not None:
+        if durations.get(last) is not None:
+            path.append(last)
+        last = previous[last]
+    return path[::-1]
+
+
+def _run_pipeline_stage(data_dir, options, name, function):
+    """
+    Runs one pipeline stage, possibly in a worker process.
+
+    Returns the trace records of the stage and its duration; the
+    result of `function` is dropped, as stages share data through
+    files.
+    """
+    global DATA_DIR
+
+    DATA_DIR = data_dir
+    start = time.perf_counter()
+    _, records = instrument.run_stage(options, name, function)
+    return records, time.perf_counter() - start
+
+
+class _InlineExecutor:
+    """
+    Runs submitted calls at once, in this process, for ``--jobs 1``.
+    """
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except BaseException as error:
+            future.set_exception(error)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
 
 
 if __name__ == "__main__":
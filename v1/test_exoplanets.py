@@ -1,11 +1,38 @@
 import csv
+import functools
 import json
+import math
+import os
 import pathlib
+import types
 
+import pytest
+
+from exoplanets import BuildCache
+from exoplanets import ExoplanetTable
+from exoplanets import KEY_FIELDNAMES
+from exoplanets import PipelineStage
+from exoplanets import REPORTS
+from exoplanets import all_data_csv
+from exoplanets import all_data_json
 from exoplanets import check_duplicates
 from exoplanets import clean_csv_data
+from exoplanets import critical_path
+from exoplanets import instrument
+from exoplanets import key_data_json
+from exoplanets import load_key_table
+from exoplanets import nasa_data_json
+from exoplanets import open_columns
+from exoplanets import parse_args
+from exoplanets import pipeline_stages
+from exoplanets import report_ranks
+from exoplanets import run_pipeline
+from exoplanets import size_exoplanets
 from exoplanets import sort_data
+from exoplanets import stream_csv_data
+from exoplanets import write_columns
 from exoplanets import write_json
+from exoplanets import write_report
 
 
 def test_check_duplicates():
@@ -73,3 +100,349 @@ def test_sort_data(tmp_path, monkeypatch):
     result = sort_data(lambda x: float(x["pl_rade"]))
 
     assert [row["pl_name"] for row in result] == ["A", "B", "C"]
+
+
+def test_sort_data_reads_the_current_json_format(tmp_path, monkeypatch):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    (tmp_path / "key_exoplanets.csv").write_text(
+        "pl_name,pl_rade\nB,0.40\nA,0.39\n", encoding="utf-8")
+    key_data_json()
+
+    (tmp_path / "key_exoplanets.csv").write_text(
+        "pl_name,pl_rade\nB,0.40\nA,0.39\nC,0.50\n", encoding="utf-8")
+    key_data_json("ndjson")
+
+    # The older pretty output is gone instead of being read stale
+    assert not (tmp_path / "key_exoplanets.json").exists()
+    result = sort_data(lambda x: float(x["pl_rade"]))
+    assert [row["pl_name"] for row in result] == ["A", "B", "C"]
+
+    key_data_json()
+    assert not (tmp_path / "key_exoplanets.ndjson").exists()
+
+
+def test_write_json_compact_and_ndjson(tmp_path):
+    rows = [{"name": "Alice", "age": "30"}, {"name": "Bob", "age": "25"}]
+
+    write_json(iter(rows), tmp_path / "compact.json", "compact")
+    write_json(iter(rows), tmp_path / "rows.ndjson", "ndjson")
+    write_json(iter([]), tmp_path / "empty.json", "compact")
+
+    compact = (tmp_path / "compact.json").read_text()
+    assert compact == '[{"name":"Alice","age":"30"},{"name":"Bob","age":"25"}]'
+    ndjson = (tmp_path / "rows.ndjson").read_text().splitlines()
+    assert [json.loads(line) for line in ndjson] == rows
+    assert json.loads((tmp_path / "empty.json").read_text()) == []
+
+
+def test_stream_csv_data_matches_separate_passes(tmp_path, monkeypatch):
+    raw = (
+        "pl_name,disc_year,disc_pubdate,sy_dist,discoverymethod,pl_orbper,"
+        "pl_orbsmax,pl_rade,pl_masse,pl_eqt,pl_insol,st_teff,st_mass,st_rad,"
+        "extra\n"
+        "B,2011,2011-07,213.9,Transit,4.05,0.04,14.2,88.9,,,5400,0.93,0.89,x\n"
+        "A,2006,2007-02,158.9,Transit,4.46,0.05,13.9,169.0,1306,,5975,1.1,1.1,y\n"
+        "B,2012,2012-01,210.0,Transit,4.05,0.04,14.0,80.0,,,5400,0.93,0.89,z\n"
+    )
+    separate = tmp_path / "separate"
+    streamed = tmp_path / "streamed"
+    for data_dir in (separate, streamed):
+        data_dir.mkdir()
+        (data_dir / "nasa_exoplanets.csv").write_text(raw, encoding="utf-8")
+
+    monkeypatch.setattr("exoplanets.DATA_DIR", separate)
+    nasa_data_json()
+    all_data_csv()
+    all_data_json()
+    clean_csv_data()
+    key_data_json()
+
+    monkeypatch.setattr("exoplanets.DATA_DIR", streamed)
+    stream_csv_data()
+
+    for name in ("nasa_exoplanets.json", "exoplanets.csv", "exoplanets.json",
+                 "key_exoplanets.csv", "key_exoplanets.json"):
+        assert (streamed / name).read_bytes() == (separate / name).read_bytes()
+
+
+def make_table(rows):
+    return ExoplanetTable.from_rows(
+        {field: row.get(field, "") for field in KEY_FIELDNAMES}
+        for row in rows
+    )
+
+
+def write_key_csv(data_dir, rows):
+    with open(data_dir / "key_exoplanets.csv", "w", newline="",
+              encoding="utf-8") as f:
+        writer = csv.DictWriter(f, KEY_FIELDNAMES, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_table_argsort_puts_missing_values_last():
+    table = make_table([
+        {"pl_name": "B", "pl_rade": "0.40"},
+        {"pl_name": "D", "pl_rade": ""},
+        {"pl_name": "A", "pl_rade": "0.39"},
+        {"pl_name": "E", "pl_rade": "0.40"},
+        {"pl_name": "C", "pl_rade": ""},
+    ])
+
+    order = table.argsort("pl_rade")
+
+    assert [table.columns["pl_name"][i] for i in order] == \
+        ["A", "B", "E", "D", "C"]
+    assert table.value("pl_rade", 1) is None
+
+
+@pytest.mark.parametrize("ratio", [1, 16])  # heap selection, full sort
+def test_table_select_matches_argsort_slices(ratio, monkeypatch):
+    monkeypatch.setattr("exoplanets.HEAP_SELECT_RATIO", ratio)
+    values = ["3", "", "1", "2", "1", "", "3", "0.5", "2"]
+    table = make_table([{"pl_name": str(i), "pl_rade": value}
+                        for i, value in enumerate(values)])
+    ranked = table.argsort("pl_rade")[:table.count("pl_rade")]
+
+    for start, stop in [(0, 3), (0, 7), (2, 5), (5, 7), (6, 20), (7, 9)]:
+        assert table.select("pl_rade", start, stop) == ranked[start:stop]
+
+
+def test_report_ranks():
+    assert report_ranks(200) is None
+    assert report_ranks(200, top=10) == (0, 10)
+    assert report_ranks(200, window=(90, 100)) == (180, 200)
+    assert report_ranks(95, window=(0, 10)) == (0, 10)
+    assert report_ranks(200, top=5, window=(50, 100)) == (100, 105)
+
+
+@pytest.mark.parametrize("argv", [["--top", "0"], ["--top", "-3"],
+                                  ["--top", "x"], ["--window", "10:5"]])
+def test_parse_args_rejects_empty_slices(argv, capsys):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+    assert f"argument {argv[0]}:" in capsys.readouterr().err
+
+
+def test_sliced_report_keeps_ranks(tmp_path, monkeypatch):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    table = make_table([
+        {"pl_name": "C", "pl_rade": "3"},
+        {"pl_name": "X", "pl_rade": ""},
+        {"pl_name": "A", "pl_rade": "1"},
+        {"pl_name": "B", "pl_rade": "2"},
+    ])
+
+    write_report(table, *REPORTS["size"], window=(50, 100))
+
+    report = (tmp_path / "exoplanets_size.txt").read_text(encoding="utf-8")
+    assert "2) Name: B" in report and "3) Name: C" in report
+    assert "Name: A" not in report and "Name: X" not in report
+
+
+def test_column_bundle_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    table = make_table([
+        {"pl_name": "Ægir b", "pl_rade": "2.5", "disc_pubdate": "2011-07"},
+        {"pl_name": "A", "pl_rade": ""},
+    ])
+    csv_path = tmp_path / "key_exoplanets.csv"
+    csv_path.write_text("stand-in", encoding="utf-8")
+    write_columns(table)
+
+    header = (tmp_path / "key_exoplanets.columns" / "pl_rade.npy").read_bytes()
+    assert header[:8] == b"\x93NUMPY\x01\x00"
+    assert (10 + int.from_bytes(header[8:10], "little")) % 64 == 0
+
+    columns = open_columns()
+    assert columns["pl_name"][:] == ["Ægir b", "A"]
+    assert columns["disc_pubdate"][1] == ""
+    assert columns["pl_rade"][0] == 2.5 and math.isnan(columns["pl_rade"][1])
+
+    loaded = load_key_table()
+    assert list(loaded.columns["pl_name"]) == ["Ægir b", "A"]
+    assert loaded.argsort("pl_rade") == table.argsort("pl_rade")
+
+    # A rewritten CSV makes the bundle stale
+    os.utime(csv_path, ns=(0, 0))
+    assert open_columns() is None
+
+
+@pytest.mark.parametrize("damage", ["delete", "truncate", "garble"])
+def test_damaged_column_bundle_falls_back_to_csv(tmp_path, monkeypatch,
+                                                 damage):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    rows = [{"pl_name": "B", "pl_rade": "2"}, {"pl_name": "A", "pl_rade": "1"}]
+    write_key_csv(tmp_path, rows)
+    write_columns(make_table(rows))
+
+    npy_path = tmp_path / "key_exoplanets.columns" / "pl_name.offsets.npy"
+    if damage == "delete":
+        npy_path.unlink()
+    elif damage == "truncate":
+        npy_path.write_bytes(npy_path.read_bytes()[:9])
+    else:
+        npy_path.write_bytes(npy_path.read_bytes()[:10] + b"{'descr'")
+
+    assert open_columns() is None
+    assert list(load_key_table().columns["pl_name"]) == ["B", "A"]
+    # The pipeline sees the bundle file as an output to rebuild
+    datasets = next(stage for stage in pipeline_stages()
+                    if stage.name == "datasets")
+    assert f"key_exoplanets.columns/{npy_path.name}" in datasets.outputs
+
+
+def test_size_report_from_table(tmp_path, monkeypatch):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    table = make_table([
+        {"pl_name": "B", "pl_rade": "2"},
+        {"pl_name": "A", "pl_rade": ""},
+    ])
+
+    size_exoplanets(table)
+
+    assert (tmp_path / "exoplanets_size.txt").read_text(encoding="utf-8") == (
+        "List of Exoplanets Size From Smaller to Biggest\n\n"
+        "1) Name: B: \n\tRadius (R⊕): 2.00 \n\tRadius (km): 12,742 \n"
+        "2) Name: A: \n\tNo data\n"
+    )
+
+
+def report_stages():
+    return [stage for stage in pipeline_stages()
+            if stage.name.startswith("report:")]
+
+
+def test_parallel_report_stages_match_serial(tmp_path, monkeypatch):
+    rows = [
+        {"pl_name": "B", "sy_dist": "10.5", "disc_year": "2011",
+         "pl_orbper": "20000", "disc_pubdate": "2011-07"},
+        {"pl_name": "A", "sy_dist": "", "pl_masse": "1.0", "st_mass": "0.9",
+         "pl_insol": "1.2"},
+    ]
+    serial = tmp_path / "serial"
+    parallel = tmp_path / "parallel"
+    for data_dir in (serial, parallel):
+        data_dir.mkdir()
+        write_key_csv(data_dir, rows)
+
+    monkeypatch.setattr("exoplanets.DATA_DIR", serial)
+    run_pipeline(report_stages(), jobs=1)
+    monkeypatch.setattr("exoplanets.DATA_DIR", parallel)
+    run_pipeline(report_stages(), jobs=2)
+
+    reports = sorted(path.name for path in serial.glob("exoplanets_*.txt"))
+    assert len(reports) == 8
+    for name in reports:
+        assert (parallel / name).read_bytes() == (serial / name).read_bytes()
+
+
+def test_report_stages_are_named_after_their_files(tmp_path, monkeypatch,
+                                                   capsys):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    write_key_csv(tmp_path, [{"pl_name": "A", "sy_dist": "1.5"},
+                             {"pl_name": "B", "pl_rade": "2.0"}])
+
+    with instrument.session("exoplanets", tmp_path / "profile"):
+        run_pipeline(report_stages(), jobs=2)
+
+    trace_path, = (tmp_path / "profile").glob("exoplanets-*.json")
+    with open(trace_path, encoding="utf-8") as f:
+        stages = json.load(f)["stages"]
+    names = [stage["name"] for stage in stages if stage["parent"] is None]
+    assert sorted(names) == sorted(
+        "report:" + pathlib.Path(filename).stem
+        for _, filename, _, _ in REPORTS.values())
+    assert all(stage["rows"] == 2 for stage in stages
+               if stage["name"] == "load_key_table")
+    out = capsys.readouterr().out
+    assert out.startswith("Critical path: report:exoplanets_")
+
+
+def test_build_cache_skips_unchanged_stages(tmp_path, monkeypatch):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    with open(tmp_path / "nasa_exoplanets.csv", "w", newline="",
+              encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=KEY_FIELDNAMES, restval="")
+        writer.writeheader()
+        writer.writerows([{"pl_name": "B", "sy_dist": "10.5", "pl_rade": "2"},
+                          {"pl_name": "A", "pl_rade": "1"}])
+
+    def build():
+        stages = [stage for stage in pipeline_stages()
+                  if stage.name != "download"]
+        durations = run_pipeline(stages, jobs=1, cache=BuildCache())
+        return durations, {path.name: path.stat().st_mtime_ns
+                           for path in tmp_path.iterdir() if path.is_file()}
+
+    durations, first = build()
+    assert None not in durations.values()
+    durations, second = build()
+    assert set(durations.values()) == {None}
+    assert second == first
+
+    # Only the report whose definition changed is written again
+    field, filename, title, entry = REPORTS["size"]
+    monkeypatch.setitem(REPORTS, "size", (field, filename, "Sizes\n", entry))
+    _, third = build()
+    changed = {name for name in third if third[name] != second[name]}
+    assert changed == {"exoplanets_size.txt", "build_manifest.json"}
+
+    # A report edited by hand is restored
+    (tmp_path / "exoplanets_mass.txt").write_text("", encoding="utf-8")
+    build()
+    assert (tmp_path / "exoplanets_mass.txt").read_text(encoding="utf-8")
+
+
+def test_build_cache_key_covers_module_constants(tmp_path, monkeypatch):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    source = tmp_path / "conversions.py"
+    source.write_text("PARSEC_KM = 3.0857e13\n", encoding="utf-8")
+    module = types.ModuleType("conversions")
+    module.__file__ = str(source)
+    key = BuildCache().stage_key([], [module], [])
+
+    source.write_text("PARSEC_KM = 3.086e13\n", encoding="utf-8")
+    assert BuildCache().stage_key([], [module], []) != key
+
+    # The pipeline keys cover the unit constants as well as its own code
+    for stage in pipeline_stages():
+        if stage.code:
+            assert {module.__name__ for module in stage.code} == \
+                {"exoplanets", "units"}
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_pipeline_runs_stages_after_their_inputs(jobs, tmp_path, monkeypatch,
+                                                 capsys):
+    monkeypatch.setattr("exoplanets.DATA_DIR", tmp_path)
+    stages = [
+        PipelineStage("report", functools.partial(_copy, "b.txt", "c.txt"),
+                      inputs=["b.txt"], outputs=["c.txt"]),
+        PipelineStage("derive", functools.partial(_copy, "a.txt", "b.txt"),
+                      inputs=["a.txt"], outputs=["b.txt"]),
+        PipelineStage("other", functools.partial(_copy, "a.txt", "d.txt"),
+                      inputs=["a.txt"], outputs=["d.txt"]),
+    ]
+    (tmp_path / "a.txt").write_text("data", encoding="utf-8")
+
+    durations = run_pipeline(stages, jobs=jobs)
+
+    assert set(durations) == {"report", "derive", "other"}
+    assert (tmp_path / "c.txt").read_text(encoding="utf-8") == "data"
+    assert (tmp_path / "d.txt").read_text(encoding="utf-8") == "data"
+    assert capsys.readouterr().out.startswith("Critical path: ")
+
+
+def _copy(source, target):
+    from exoplanets import DATA_DIR
+    (DATA_DIR / target).write_text((DATA_DIR / source).read_text())
+
+
+def test_critical_path():
+    depends = {"download": set(), "datasets": {"download"},
+               "fast": {"datasets"}, "slow": {"datasets"}, "skipped": set()}
+    durations = {"download": 1.0, "datasets": None, "fast": 0.5,
+                 "slow": 2.0, "skipped": None}
+
+    assert critical_path(depends, durations) == ["download", "slow"]